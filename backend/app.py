@@ -3,9 +3,11 @@ from flask_cors import CORS
 from database import init_db, db
 from routes import register_blueprints
 from models import *
+from utils.cache import cache
 import os
-from datetime import datetime, timedelta
-from sqlalchemy import func, and_, or_
+from datetime import datetime, timedelta, time
+from sqlalchemy import func, and_, or_, case, select
+from sqlalchemy.orm import selectinload, joinedload
 import uuid
 
 app = Flask(__name__, instance_relative_config=False)
@@ -14,11 +16,9 @@ CORS(app)
 # Initialize database
 init_db(app)
 
-# Import and register blueprints after app initialization
+# Register blueprints after app initialization
 try:
-    from routes import register_blueprints
     register_blueprints(app)
-    print("Blueprints registered successfully")
 except ImportError as e:
     print(f"Error importing blueprints: {e}")
     print("Continuing without blueprints...")
@@ -63,36 +63,58 @@ def api_info():
         }
     })
 
+DASHBOARD_CACHE_TTL = 30  # seconds
+
 # Dashboard endpoint (main overview)
 @app.route('/api/dashboard', methods=['GET'])
 def get_dashboard():
     try:
-        # Get dashboard statistics
-        total_products = Product.query.filter_by(is_active=True).count()
-        total_customers = Customer.query.count()
+        cache_key = f"dashboard:v1:{datetime.utcnow().strftime('%Y%m%d%H%M')}"
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return jsonify(cached)
         
-        # Sales today
         today = datetime.utcnow().date()
-        today_sales = Sale.query.filter(
-            func.date(Sale.created_at) == today
-        ).all()
-        today_revenue = sum(sale.total_amount for sale in today_sales)
-        
-        # Sales this month
-        first_day_month = today.replace(day=1)
-        month_sales = Sale.query.filter(
-            Sale.created_at >= first_day_month
-        ).all()
-        month_revenue = sum(sale.total_amount for sale in month_sales)
+        today_start = datetime.combine(today, time.min)
+        tomorrow_start = today_start + timedelta(days=1)
+        month_start = datetime.combine(today.replace(day=1), time.min)
+        is_today = and_(Sale.created_at >= today_start, Sale.created_at < tomorrow_start)
         
-        # Low stock products
-        low_stock_products = Product.query.filter(
-            Product.stock_quantity <= Product.min_stock_level,
-            Product.is_active == True
-        ).count()
+        # Get all dashboard statistics in a single statement: catalogue counts
+        # ride along as scalar subqueries, sales totals use conditional aggregates
+        # over this month's sales (today is always within the month).
+        (
+            total_products,
+            total_customers,
+            low_stock_products,
+            today_revenue,
+            today_sales_count,
+            month_revenue,
+            month_sales_count
+        ) = db.session.query(
+            select(func.count(Product.id)).where(
+                Product.is_active == True
+            ).scalar_subquery(),
+            func.coalesce(
+                select(Counter.value).where(Counter.name == 'customers').scalar_subquery(), 0
+            ),
+            select(func.count(Product.id)).where(
+                Product.stock_quantity <= Product.min_stock_level,
+                Product.is_active == True
+            ).scalar_subquery(),
+            func.coalesce(func.sum(case((is_today, Sale.total_amount), else_=0.0)), 0.0),
+            func.count(case((is_today, Sale.id))),
+            func.coalesce(func.sum(Sale.total_amount), 0.0),
+            func.count(Sale.id)
+        ).select_from(Sale).filter(
+            Sale.created_at >= month_start
+        ).one()
         
         # Recent sales
-        recent_sales = Sale.query.order_by(Sale.created_at.desc()).limit(5).all()
+        recent_sales = Sale.query.options(
+            joinedload(Sale.customer),
+            selectinload(Sale.items).joinedload(SaleItem.product)
+        ).order_by(Sale.created_at.desc()).limit(5).all()
         
         # Top selling products (last 30 days)
         thirty_days_ago = datetime.utcnow() - timedelta(days=30)
@@ -105,24 +127,30 @@ def get_dashboard():
             func.sum(SaleItem.quantity).desc()
         ).limit(5).all()
         
-        return jsonify({
+        payload = {
             'success': True,
             'data': {
                 'total_products': total_products,
                 'total_customers': total_customers,
                 'today_revenue': today_revenue,
-                'today_sales_count': len(today_sales),
+                'today_sales_count': today_sales_count,
                 'month_revenue': month_revenue,
-                'month_sales_count': len(month_sales),
+                'month_sales_count': month_sales_count,
                 'low_stock_products': low_stock_products,
                 'recent_sales': [sale.to_dict() for sale in recent_sales],
                 'top_products': [{'name': p[0], 'total_sold': p[1]} for p in top_products]
             }
-        })
+        }
+        cache.set(cache_key, payload, DASHBOARD_CACHE_TTL)
+        return jsonify(payload)
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
-# Main execution
+# Main execution (development server only; production runs wsgi.py under gunicorn)
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=8000)
\ No newline at end of file
+    if os.environ.get('FLASK_DEV'):
+        app.run(debug=True, host='0.0.0.0', port=8000)
+    else:
+        print("Set FLASK_DEV=1 to start the development server, or run:")
+        print("gunicorn wsgi:application")
\ No newline at end of file
@@ -6,7 +6,7 @@ Creates pos_system.db with sample data
 import sqlite3
 from datetime import datetime, timedelta
 import random
-import uuid
+import os
 
 def create_database():
     """Create the database and all tables"""
@@ -138,13 +138,117 @@ def create_database():
         )
     ''')
     
+    # Create Counters table, kept current by triggers so dashboards
+    # can read row counts without scanning
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS counters (
+            name VARCHAR(50) PRIMARY KEY,
+            value INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    cursor.execute("INSERT OR IGNORE INTO counters (name, value) SELECT 'customers', COUNT(*) FROM customers")
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS customers_count_ai AFTER INSERT ON customers
+        BEGIN UPDATE counters SET value = value + 1 WHERE name = 'customers'; END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS customers_count_ad AFTER DELETE ON customers
+        BEGIN UPDATE counters SET value = value - 1 WHERE name = 'customers'; END
+    ''')
+    
+    # Indexes for date-range and join lookups on sales. SQLite indexes
+    # implicitly carry the rowid, so idx_sales_created_at already covers sales.id.
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_sales_created_at ON sales(created_at)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS ix_sale_items_sale_id ON sale_items(sale_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_sale_items_product_sale ON sale_items(product_id, sale_id, quantity)')
+    
+    # Covers the active / low-stock product counts
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_products_active ON products(is_active, stock_quantity, min_stock_level)')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_products_lowstock ON products(id)
+        WHERE is_active = 1 AND stock_quantity <= min_stock_level
+    ''')
+    
     conn.commit()
     return conn
 
+def sample_in_place(pool, k, randrange):
+    """Move k random items to the front of pool and return them.
+    
+    A partial Fisher-Yates shuffle: unlike random.sample it does not copy the
+    whole population on every call, so a single pool list can be reused.
+    """
+    n = len(pool)
+    k = min(k, n)
+    for i in range(k):
+        j = randrange(i, n)
+        pool[i], pool[j] = pool[j], pool[i]
+    return pool[:k]
+
+def generate_sales(start_date, num_days, products_data, customer_ids, last_sale_id, seed=None):
+    """Generate sample sales and sale item rows ready for executemany"""
+    rng = random.Random(seed)
+    # Bind the RNG methods once; they are called several times per sale
+    uniform, choices, randrange = rng.uniform, rng.choices, rng.randrange
+    product_pool = list(products_data)
+    tax_rate = 0.08  # 8% tax
+    
+    # Draw every per-sale random value in one batched call each
+    daily_counts = choices(range(3, 9), k=num_days)  # 3-8 sales per day
+    total_sales = sum(daily_counts)
+    item_counts = choices(range(1, 6), k=total_sales)  # 1-5 items per sale
+    quantities = iter(choices(range(1, 4), k=sum(item_counts)))
+    sale_customers = choices(customer_ids, k=total_sales)
+    has_customer = choices((True, False), weights=(7, 3), k=total_sales)  # 70% have customers
+    has_discount = choices((True, False), weights=(3, 7), k=total_sales)  # 30% chance of discount
+    payment_methods = choices(['cash', 'card', 'mobile_payment'], k=total_sales)
+    hours = choices(range(9, 21), k=total_sales)
+    minutes = choices(range(60), k=total_sales)
+    
+    sale_id = last_sale_id
+    sales_rows = []
+    sale_item_rows = []
+    n = 0
+    
+    for day, daily_sales in enumerate(daily_counts):
+        current_date = start_date + timedelta(days=day)
+        date_part = current_date.strftime('%Y%m%d')
+        
+        for _ in range(daily_sales):
+            sale_id += 1
+            sale_number = f"SALE-{date_part}-{os.urandom(4).hex().upper()}"
+            customer_id = sale_customers[n] if has_customer[n] else None
+            
+            selected_products = sample_in_place(product_pool, item_counts[n], randrange)
+            
+            subtotal = 0
+            for product_id, price, cost_price in selected_products:
+                quantity = next(quantities)
+                total_price = price * quantity
+                subtotal += total_price
+                sale_item_rows.append((sale_id, product_id, quantity, price, total_price))
+            
+            # Calculate tax and discount
+            discount_amount = subtotal * uniform(0, 0.1) if has_discount[n] else 0
+            tax_amount = (subtotal - discount_amount) * tax_rate
+            total_amount = subtotal + tax_amount - discount_amount
+            
+            sale_datetime = current_date + timedelta(hours=hours[n], minutes=minutes[n])
+            
+            sales_rows.append((sale_id, sale_number, customer_id, subtotal, tax_amount, discount_amount,
+                               total_amount, payment_methods[n], 'completed', sale_datetime))
+            n += 1
+    
+    return sales_rows, sale_item_rows
+
 def insert_sample_data(conn):
     """Insert sample data into all tables"""
     cursor = conn.cursor()
     
+    # The seed load is disposable, so trade durability for bulk-insert speed
+    cursor.execute('PRAGMA synchronous=OFF')
+    cursor.execute('PRAGMA journal_mode=MEMORY')
+    
     print("Inserting sample data...")
     
     # Insert Categories
@@ -241,62 +345,23 @@ def insert_sample_data(conn):
     # Generate sales for the last 90 days
     start_date = datetime.now() - timedelta(days=90)
     
-    for day in range(90):
-        current_date = start_date + timedelta(days=day)
-        
-        # Generate 3-8 sales per day
-        daily_sales = random.randint(3, 8)
-        
-        for _ in range(daily_sales):
-            # Generate sale
-            sale_number = f"SALE-{current_date.strftime('%Y%m%d')}-{str(uuid.uuid4())[:8].upper()}"
-            customer_id = random.choice(customer_ids) if random.random() > 0.3 else None  # 70% have customers
-            
-            # Generate 1-5 items per sale
-            num_items = random.randint(1, 5)
-            selected_products = random.sample(products_data, min(num_items, len(products_data)))
-            
-            subtotal = 0
-            sale_items = []
-            
-            for product_id, price, cost_price in selected_products:
-                quantity = random.randint(1, 3)
-                unit_price = price
-                total_price = unit_price * quantity
-                subtotal += total_price
-                
-                sale_items.append((product_id, quantity, unit_price, total_price))
-            
-            # Calculate tax and discount
-            tax_rate = 0.08  # 8% tax
-            discount_amount = subtotal * random.uniform(0, 0.1) if random.random() > 0.7 else 0  # 30% chance of discount
-            tax_amount = (subtotal - discount_amount) * tax_rate
-            total_amount = subtotal + tax_amount - discount_amount
-            
-            payment_method = random.choice(['cash', 'card', 'mobile_payment'])
-            
-            # Add some random hours/minutes to the date
-            sale_datetime = current_date + timedelta(
-                hours=random.randint(9, 20),
-                minutes=random.randint(0, 59)
-            )
-            
-            # Insert sale
-            cursor.execute('''
-                INSERT INTO sales (sale_number, customer_id, subtotal, tax_amount, 
-                                 discount_amount, total_amount, payment_method, status, created_at)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (sale_number, customer_id, subtotal, tax_amount, discount_amount, 
-                  total_amount, payment_method, 'completed', sale_datetime))
-            
-            sale_id = cursor.lastrowid
-            
-            # Insert sale items
-            for product_id, quantity, unit_price, total_price in sale_items:
-                cursor.execute('''
-                    INSERT INTO sale_items (sale_id, product_id, quantity, unit_price, total_price)
-                    VALUES (?, ?, ?, ?, ?)
-                ''', (sale_id, product_id, quantity, unit_price, total_price))
+    # Sale IDs are assigned up front so sales and their items can be
+    # inserted with a single executemany each
+    cursor.execute('SELECT COALESCE(MAX(id), 0) FROM sales')
+    last_sale_id = cursor.fetchone()[0]
+    sales_rows, sale_item_rows = generate_sales(start_date, 90, products_data, customer_ids, last_sale_id)
+    
+    # Insert sales and sale items
+    cursor.executemany('''
+        INSERT INTO sales (id, sale_number, customer_id, subtotal, tax_amount, 
+                         discount_amount, total_amount, payment_method, status, created_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', sales_rows)
+    
+    cursor.executemany('''
+        INSERT INTO sale_items (sale_id, product_id, quantity, unit_price, total_price)
+        VALUES (?, ?, ?, ?, ?)
+    ''', sale_item_rows)
     
     # Insert sample purchases
     print("Generating sample purchases...")
@@ -304,14 +369,21 @@ def insert_sample_data(conn):
     suppliers = ['Tech Supplier Inc', 'Fashion Wholesale', 'Food Distributors LLC', 
                 'Book Publishers', 'Home Goods Supply', 'Sports Equipment Co']
     
+    cursor.execute('SELECT COALESCE(MAX(id), 0) FROM purchases')
+    purchase_id = cursor.fetchone()[0]
+    purchases_rows = []
+    purchase_item_rows = []
+    
+    product_pool = list(products_data)
+    
     for i in range(20):  # 20 sample purchases
         purchase_date = start_date + timedelta(days=random.randint(0, 89))
-        purchase_number = f"PUR-{purchase_date.strftime('%Y%m%d')}-{str(uuid.uuid4())[:8].upper()}"
+        purchase_number = f"PUR-{purchase_date.strftime('%Y%m%d')}-{os.urandom(4).hex().upper()}"
         supplier = random.choice(suppliers)
         
         # Select 2-6 products for purchase
         num_items = random.randint(2, 6)
-        selected_products = random.sample(products_data, min(num_items, len(products_data)))
+        selected_products = sample_in_place(product_pool, num_items, random.randrange)
         
         total_amount = 0
         purchase_items = []
@@ -326,20 +398,22 @@ def insert_sample_data(conn):
         
         status = random.choice(['completed', 'pending'])
         
-        # Insert purchase
-        cursor.execute('''
-            INSERT INTO purchases (purchase_number, supplier_name, total_amount, status, created_at)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (purchase_number, supplier, total_amount, status, purchase_date))
-        
-        purchase_id = cursor.lastrowid
+        purchase_id += 1
+        purchases_rows.append((purchase_id, purchase_number, supplier, total_amount, status, purchase_date))
         
-        # Insert purchase items
         for product_id, quantity, unit_cost, total_cost in purchase_items:
-            cursor.execute('''
-                INSERT INTO purchase_items (purchase_id, product_id, quantity, unit_cost, total_cost, batch_id)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (purchase_id, product_id, quantity, unit_cost, total_cost, None))
+            purchase_item_rows.append((purchase_id, product_id, quantity, unit_cost, total_cost, None))
+    
+    # Insert purchases and purchase items
+    cursor.executemany('''
+        INSERT INTO purchases (id, purchase_number, supplier_name, total_amount, status, created_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', purchases_rows)
+    
+    cursor.executemany('''
+        INSERT INTO purchase_items (purchase_id, product_id, quantity, unit_cost, total_cost, batch_id)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', purchase_item_rows)
     
     conn.commit()
     print("Sample data inserted successfully!")
@@ -1,7 +1,10 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event, func, insert, select, text
+from sqlalchemy.schema import CreateIndex, CreateTable
 from datetime import datetime
 import sqlite3
 import os
+import zlib
 
 db = SQLAlchemy()
 
@@ -12,51 +15,109 @@ def init_db(app):
     db_path = os.path.join(basedir, 'pos_system.db')
     app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{db_path}'
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    # One pooled connection per gunicorn worker thread (see gunicorn.conf.py)
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', {
+        'pool_size': int(os.environ.get('POS_THREADS', 4)),
+        'max_overflow': 2
+    })
     db.init_app(app)
     
     with app.app_context():
-        db.create_all()
+        event.listen(db.engine, 'connect', _set_sqlite_pragmas)
+        # Skip create_all() when the schema recorded in the database matches
+        # the models; user_version travels with the database file itself.
+        fingerprint = _schema_fingerprint()
+        if db.session.execute(text('PRAGMA user_version')).scalar() != fingerprint:
+            db.create_all()
+            # create_all() skips tables that already exist, so add any
+            # indexes introduced since those tables were created. IF NOT
+            # EXISTS rather than checkfirst: SQLite reflection cannot see
+            # expression indexes, so checkfirst would re-create them.
+            skipped = False
+            for table in db.metadata.sorted_tables:
+                for index in table.indexes:
+                    duplicates = _duplicate_keys(index) if index.unique else []
+                    if duplicates:
+                        # Existing rows would make CREATE UNIQUE INDEX fail;
+                        # report them and leave user_version unset so the
+                        # index is retried on the next start
+                        app.logger.error(
+                            'Skipped unique index %s: %s has duplicate values %s; '
+                            'merge or rename those rows and restart',
+                            index.name, table.name, ', '.join(repr(tuple(key)) for key in duplicates)
+                        )
+                        skipped = True
+                        continue
+                    db.session.execute(CreateIndex(index, if_not_exists=True))
+            if not skipped:
+                db.session.execute(text(f'PRAGMA user_version = {fingerprint}'))
+            db.session.commit()
+    
+    # Seeding is opt-in via `flask --app app seed` so workers don't query on startup
+    @app.cli.command('seed')
+    def seed_command():
+        """Seed the database with sample data"""
         seed_data()
+        print("Database seeded")
+
+def _set_sqlite_pragmas(dbapi_conn, connection_record):
+    """Enable WAL and a larger page cache on every new SQLite connection"""
+    cursor = dbapi_conn.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute('PRAGMA synchronous=NORMAL')
+    cursor.execute('PRAGMA cache_size=-65536')  # 64MB
+    cursor.execute('PRAGMA temp_store=MEMORY')
+    cursor.execute('PRAGMA mmap_size=268435456')  # 256MB
+    cursor.close()
+
+def _duplicate_keys(index):
+    """Return up to 10 key values that occur more than once in an index's table"""
+    keys = select(*index.expressions).group_by(*index.expressions).having(func.count() > 1)
+    return db.session.execute(keys.limit(10)).all()
+
+def _schema_fingerprint():
+    """Return a 31-bit checksum of the DDL for every mapped table and index"""
+    ddl = []
+    for table in db.metadata.sorted_tables:
+        ddl.append(str(CreateTable(table).compile(db.engine)))
+        for index in sorted(table.indexes, key=lambda i: i.name or ''):
+            ddl.append(str(CreateIndex(index).compile(db.engine)))
+    ddl.extend(db.metadata.info.get('ddl', []))
+    return zlib.crc32(''.join(ddl).encode()) & 0x7fffffff
+
+def bulk_insert(model, rows):
+    """Insert a list of column dicts as batched multi-row INSERTs"""
+    if rows:
+        db.session.execute(insert(model), rows)
 
 def seed_data():
     """Seed initial data"""
     from models import Category, Product, Customer
     
     # Check if data already exists
-    if Category.query.first():
+    if db.session.query(Category.id).limit(1).scalar() is not None:
         return
     
     # Create categories
-    categories = [
-        Category(name='Electronics', description='Electronic items'),
-        Category(name='Clothing', description='Clothing and accessories'),
-        Category(name='Food', description='Food and beverages'),
-        Category(name='Books', description='Books and magazines')
-    ]
-    
-    for category in categories:
-        db.session.add(category)
-    
-    db.session.commit()
+    bulk_insert(Category, [
+        {'id': 1, 'name': 'Electronics', 'description': 'Electronic items'},
+        {'id': 2, 'name': 'Clothing', 'description': 'Clothing and accessories'},
+        {'id': 3, 'name': 'Food', 'description': 'Food and beverages'},
+        {'id': 4, 'name': 'Books', 'description': 'Books and magazines'}
+    ])
     
     # Create sample products
-    products = [
-        Product(name='Laptop', price=999.99, stock_quantity=10, category_id=1, sku='LAP001'),
-        Product(name='T-Shirt', price=19.99, stock_quantity=50, category_id=2, sku='TSH001'),
-        Product(name='Coffee', price=4.99, stock_quantity=100, category_id=3, sku='COF001'),
-        Product(name='Novel', price=12.99, stock_quantity=25, category_id=4, sku='NOV001')
-    ]
-    
-    for product in products:
-        db.session.add(product)
+    bulk_insert(Product, [
+        {'name': 'Laptop', 'price': 999.99, 'stock_quantity': 10, 'category_id': 1, 'sku': 'LAP001'},
+        {'name': 'T-Shirt', 'price': 19.99, 'stock_quantity': 50, 'category_id': 2, 'sku': 'TSH001'},
+        {'name': 'Coffee', 'price': 4.99, 'stock_quantity': 100, 'category_id': 3, 'sku': 'COF001'},
+        {'name': 'Novel', 'price': 12.99, 'stock_quantity': 25, 'category_id': 4, 'sku': 'NOV001'}
+    ])
     
     # Create sample customers
-    customers = [
-        Customer(name='John Doe', email='john@example.com', phone='123-456-7890'),
-        Customer(name='Jane Smith', email='jane@example.com', phone='098-765-4321')
-    ]
-    
-    for customer in customers:
-        db.session.add(customer)
+    bulk_insert(Customer, [
+        {'name': 'John Doe', 'email': 'john@example.com', 'phone': '123-456-7890'},
+        {'name': 'Jane Smith', 'email': 'jane@example.com', 'phone': '098-765-4321'}
+    ])
     
     db.session.commit()
\ No newline at end of file
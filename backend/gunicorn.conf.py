@@ -0,0 +1,16 @@
+"""
+Gunicorn settings for the POS System API (loaded automatically from this directory)
+
+Requests spend most of their time waiting on SQLite, so each worker process
+serves several requests concurrently on threads instead of running async
+views; POS_WORKERS and POS_THREADS override the defaults.
+"""
+
+import multiprocessing
+import os
+
+bind = os.environ.get('POS_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('POS_WORKERS', multiprocessing.cpu_count()))
+worker_class = 'gthread'
+threads = int(os.environ.get('POS_THREADS', 4))
+preload_app = True
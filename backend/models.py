@@ -1,8 +1,23 @@
 from database import db
 from datetime import datetime
-from sqlalchemy import func
+from functools import cached_property
+import sqlite3
+from flask import g, has_app_context
+from sqlalchemy import and_, func, event, literal_column, text
+from sqlalchemy.orm import Session
 
-class Category(db.Model):
+class ISOTimestampMixin:
+    """Caches the serialized created_at, which never changes after insert"""
+    
+    @cached_property
+    def created_at_iso(self):
+        return self.created_at.isoformat() + "Z"
+
+@event.listens_for(ISOTimestampMixin, 'refresh', propagate=True)
+def _reset_created_at_iso(target, context, attrs):
+    target.__dict__.pop('created_at_iso', None)
+
+class Category(ISOTimestampMixin, db.Model):
     __tablename__ = 'categories'
     
     id = db.Column(db.Integer, primary_key=True)
@@ -13,16 +28,22 @@ class Category(db.Model):
     # Relationships
     products = db.relationship('Product', backref='category', lazy=True)
     
-    def to_dict(self):
+    # Case-insensitive uniqueness, enforced by the database on insert/update
+    __table_args__ = (db.Index('uq_categories_name_lower', func.lower(name), unique=True),)
+    
+    def to_dict(self, product_count=None):
+        """Serialize the category; pass product_count when it is already known"""
+        if product_count is None:
+            product_count = db.session.query(func.count(Product.id)).filter(Product.category_id == self.id).scalar()
         return {
             'id': self.id,
             'name': self.name,
             'description': self.description,
-            'created_at': self.created_at.isoformat() + "Z",
-            'product_count': len(self.products)
+            'created_at': self.created_at_iso,
+            'product_count': product_count
         }
 
-class Product(db.Model):
+class Product(ISOTimestampMixin, db.Model):
     __tablename__ = 'products'
     
     id = db.Column(db.Integer, primary_key=True)
@@ -34,18 +55,33 @@ class Product(db.Model):
     min_stock_level = db.Column(db.Integer, default=5)
     sku = db.Column(db.String(50), unique=True, nullable=False)
     barcode = db.Column(db.String(100))
-    category_id = db.Column(db.Integer, db.ForeignKey('categories.id'), nullable=False)
+    category_id = db.Column(db.Integer, db.ForeignKey('categories.id'), nullable=False, index=True)
     is_active = db.Column(db.Boolean, default=True)
     batch_management_enabled = db.Column(db.Boolean, default=False, nullable=False)
     gst_rate = db.Column(db.Float, default=0.0)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
-    def to_dict(self):
+    # Serves the inventory listing's (name, id) order and keyset seeks
+    __table_args__ = (db.Index('ix_products_active_name', 'is_active', 'name'),)
+    
+    def to_dict(self, stock_map=None, category_name=None, batches=None):
+        """Serialize the product.
+        
+        List endpoints pass stock_map (from compute_batch_stock_map) and
+        optionally category_name/batches to avoid per-product queries.
+        """
         stock = self.stock_quantity
         # If batch management is on, the true stock is the sum of batch stocks.
         if self.batch_management_enabled:
-            stock = db.session.query(func.sum(ProductBatch.stock_quantity)).filter_by(product_id=self.id).scalar() or 0
+            if stock_map is not None:
+                stock = stock_map.get(self.id, 0)
+            else:
+                stock = compute_batch_stock_map([self.id])[self.id]
+        if category_name is None and self.category:
+            category_name = self.category.name
+        if batches is None and self.batch_management_enabled:
+            batches = self.batches
 
         return {
             'id': self.id,
@@ -58,17 +94,26 @@ class Product(db.Model):
             'sku': self.sku,
             'barcode': self.barcode,
             'category_id': self.category_id,
-            'category_name': self.category.name if self.category else None,
+            'category_name': category_name,
             'is_active': self.is_active,
             'is_low_stock': stock <= self.min_stock_level,
-            'created_at': self.created_at.isoformat() + "Z",
+            'created_at': self.created_at_iso,
             'updated_at': self.updated_at.isoformat() + "Z",
             'batch_management_enabled': self.batch_management_enabled,
             'gst_rate': self.gst_rate,
-            'batches': [b.to_dict() for b in self.batches] if self.batch_management_enabled else []
+            'batches': [b.to_dict() for b in batches] if self.batch_management_enabled else []
         }
 
-class Customer(db.Model):
+def _customer_name_prefix(name):
+    """Lower-cased first word of a customer name column, as a SQL expression"""
+    trimmed = func.trim(name)
+    space = literal_column("' '")
+    one = literal_column('1')
+    # Constants are literals, not bound parameters, so SQLite can match the
+    # expression against an index built on it
+    return func.lower(func.substr(trimmed, one, func.instr(trimmed.op('||')(space), space) - one))
+
+class Customer(ISOTimestampMixin, db.Model):
     __tablename__ = 'customers'
     
     id = db.Column(db.Integer, primary_key=True)
@@ -79,12 +124,33 @@ class Customer(db.Model):
     gst_number = db.Column(db.String(15), unique=True, nullable=True)
     opening_balance = db.Column(db.Float, default=0.0)
     # store_credit = db.Column(db.Float, default=0.0)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     
     # Relationships
     sales = db.relationship('Sale', backref='customer', lazy=True)
     
-    def to_dict(self):
+    # Declared with the table: the literal constants in the expression keep
+    # a standalone Index from finding which table it belongs to.
+    # SQLite index entries end with the rowid (id), so ix_customers_name also
+    # serves the (name, id) keyset order.
+    __table_args__ = (
+        db.Index('ix_customers_name', name),
+        db.Index('ix_customers_name_prefix', _customer_name_prefix(name)),
+    )
+    
+    def to_dict(self, total_purchases=None):
+        """Serialize the customer.
+        
+        List endpoints pass total_purchases (from compute_customer_totals)
+        so the customer's sales are never loaded just to be summed.
+        """
+        if total_purchases is None:
+            if 'sales' in self.__dict__:
+                total_purchases = sum(sale.total_amount for sale in self.sales)
+            else:
+                total_purchases = db.session.query(
+                    func.coalesce(func.sum(Sale.total_amount), 0.0)
+                ).filter(Sale.customer_id == self.id).scalar()
         return {
             'id': self.id,
             'name': self.name,
@@ -94,11 +160,11 @@ class Customer(db.Model):
             'gst_number': self.gst_number,
             'opening_balance': self.opening_balance,
             # 'store_credit': self.store_credit,
-            'created_at': self.created_at.isoformat() + "Z",
-            'total_purchases': sum(sale.total_amount for sale in self.sales)
+            'created_at': self.created_at_iso,
+            'total_purchases': total_purchases
         }
 
-class Sale(db.Model):
+class Sale(ISOTimestampMixin, db.Model):
     __tablename__ = 'sales'
     
     id = db.Column(db.Integer, primary_key=True)
@@ -115,19 +181,27 @@ class Sale(db.Model):
     # Relationships
     items = db.relationship('SaleItem', backref='sale', lazy=True, cascade='all, delete-orphan')
     
+    __table_args__ = (
+        # Per-customer history in date order; total_amount makes the
+        # per-customer COUNT/SUM/MAX aggregates index-only
+        db.Index('ix_sales_customer_created', 'customer_id', 'created_at', 'total_amount'),
+        db.Index('idx_sales_created_at', 'created_at'),
+    )
+    
     def to_dict(self):
+        customer = self.customer
         return {
             'id': self.id,
             'sale_number': self.sale_number,
             'customer_id': self.customer_id,
-            'customer_name': self.customer.name if self.customer else 'Walk-in Customer',
+            'customer_name': customer.name if customer else 'Walk-in Customer',
             'subtotal': self.subtotal,
             'tax_amount': self.tax_amount,
             'discount_amount': self.discount_amount,
             'total_amount': self.total_amount,
             'payment_method': self.payment_method,
             'status': self.status,
-            'created_at': self.created_at.isoformat() + "Z",
+            'created_at': self.created_at_iso,
             'items': [item.to_dict() for item in self.items]
         }
 
@@ -135,7 +209,7 @@ class SaleItem(db.Model):
     __tablename__ = 'sale_items'
     
     id = db.Column(db.Integer, primary_key=True)
-    sale_id = db.Column(db.Integer, db.ForeignKey('sales.id'), nullable=False)
+    sale_id = db.Column(db.Integer, db.ForeignKey('sales.id'), nullable=False, index=True)
     product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
     batch_id = db.Column(db.Integer, db.ForeignKey('product_batches.id'), nullable=True)
     quantity = db.Column(db.Integer, nullable=False)
@@ -145,19 +219,23 @@ class SaleItem(db.Model):
     # Relationships
     product = db.relationship('Product', backref='sale_items')
     
+    # Leading product_id column also serves plain product_id lookups
+    __table_args__ = (db.Index('idx_sale_items_product_sale', 'product_id', 'sale_id', 'quantity'),)
+    
     def to_dict(self):
+        product = self.product
         return {
             'id': self.id,
             'sale_id': self.sale_id,
             'product_id': self.product_id,
             'batch_id': self.batch_id,
-            'product_name': self.product.name if self.product else None,
+            'product_name': product.name if product else None,
             'quantity': self.quantity,
             'unit_price': self.unit_price,
             'total_price': self.total_price
         }
 
-class Purchase(db.Model):
+class Purchase(ISOTimestampMixin, db.Model):
     __tablename__ = 'purchases'
     
     id = db.Column(db.Integer, primary_key=True)
@@ -177,7 +255,7 @@ class Purchase(db.Model):
             'supplier_name': self.supplier_name,
             'total_amount': self.total_amount,
             'status': self.status,
-            'created_at': self.created_at.isoformat() + "Z",
+            'created_at': self.created_at_iso,
             'items': [item.to_dict() for item in self.items]
         }
 
@@ -185,8 +263,8 @@ class PurchaseItem(db.Model):
     __tablename__ = 'purchase_items'
     
     id = db.Column(db.Integer, primary_key=True)
-    purchase_id = db.Column(db.Integer, db.ForeignKey('purchases.id'), nullable=False)
-    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
+    purchase_id = db.Column(db.Integer, db.ForeignKey('purchases.id'), nullable=False, index=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False, index=True)
     batch_id = db.Column(db.Integer, db.ForeignKey('product_batches.id'), nullable=True)
     quantity = db.Column(db.Integer, nullable=False)
     unit_cost = db.Column(db.Float, nullable=False)
@@ -196,18 +274,19 @@ class PurchaseItem(db.Model):
     product = db.relationship('Product', backref='purchase_items')
     
     def to_dict(self):
+        product = self.product
         return {
             'id': self.id,
             'purchase_id': self.purchase_id,
             'product_id': self.product_id,
             'batch_id': self.batch_id,
-            'product_name': self.product.name if self.product else None,
+            'product_name': product.name if product else None,
             'quantity': self.quantity,
             'unit_cost': self.unit_cost,
             'total_cost': self.total_cost
         }
 
-class ProductBatch(db.Model):
+class ProductBatch(ISOTimestampMixin, db.Model):
     __tablename__ = 'product_batches'
     
     id = db.Column(db.Integer, primary_key=True)
@@ -226,7 +305,11 @@ class ProductBatch(db.Model):
     
     product = db.relationship('Product', backref=db.backref('batches', lazy=True, cascade='all, delete-orphan'))
     
-    __table_args__ = (db.UniqueConstraint('product_id', 'batch_number', name='_product_batch_uc'),)
+    __table_args__ = (
+        db.UniqueConstraint('product_id', 'batch_number', name='_product_batch_uc'),
+        # Lets the per-product batch stock SUM run as an index-only scan
+        db.Index('ix_batches_product_stock', 'product_id', 'stock_quantity'),
+    )
 
     def to_dict(self):
         return {
@@ -234,10 +317,60 @@ class ProductBatch(db.Model):
             'stock_quantity': self.stock_quantity, 'barcode': self.barcode,
             'purchase_price': self.purchase_price, 'sale_price': self.sale_price,
             'gst_rate': self.gst_rate, 'expiry_date': self.expiry_date.isoformat() if self.expiry_date else None,
-            'created_at': self.created_at.isoformat() + "Z",
+            'created_at': self.created_at_iso,
         }
 
-class Return(db.Model):
+def compute_batch_stock_map(product_ids):
+    """Return {product_id: total batch stock} for the given products.
+    
+    Totals are memoized on flask.g for the rest of the request, so only ids
+    not seen yet are queried, all in one IN query.
+    """
+    if not product_ids:
+        return {}
+    known = g.setdefault('batch_stock_map', {}) if has_app_context() else {}
+    missing = {pid for pid in product_ids if pid not in known}
+    if missing:
+        rows = db.session.query(
+            ProductBatch.product_id, func.sum(ProductBatch.stock_quantity)
+        ).filter(ProductBatch.product_id.in_(missing)).group_by(ProductBatch.product_id).all()
+        known.update(dict.fromkeys(missing, 0))
+        known.update((product_id, total or 0) for product_id, total in rows)
+    return {pid: known[pid] for pid in product_ids}
+
+@event.listens_for(Session, 'after_flush')
+def _reset_batch_stock_map(session, flush_context):
+    """Writes may change batch stock, so drop the request's memoized totals"""
+    if has_app_context():
+        g.pop('batch_stock_map', None)
+
+CUSTOMER_NAME_PREFIX = _customer_name_prefix(Customer.name)
+
+# Let the duplicate-customer GROUP BYs walk an index instead of sorting the table.
+# The partial index's WHERE uses a literal '' so queries written the same way match it;
+# email needs no extra index since its UNIQUE constraint already provides one.
+CUSTOMER_HAS_PHONE = and_(Customer.phone.isnot(None), Customer.phone != literal_column("''"))
+db.Index('ix_customers_phone', Customer.phone, sqlite_where=CUSTOMER_HAS_PHONE)
+
+def compute_customer_totals(customer_ids):
+    """Return {customer_id: total sales amount} for the given customers in one query"""
+    if not customer_ids:
+        return {}
+    rows = db.session.query(
+        Sale.customer_id, func.sum(Sale.total_amount)
+    ).filter(Sale.customer_id.in_(customer_ids)).group_by(Sale.customer_id).all()
+    return {customer_id: total or 0 for customer_id, total in rows}
+
+def compute_customer_sale_stats(customer_ids):
+    """Return {customer_id: (order count, total spent, last sale time)} in one query"""
+    if not customer_ids:
+        return {}
+    rows = db.session.query(
+        Sale.customer_id, func.count(Sale.id), func.sum(Sale.total_amount), func.max(Sale.created_at)
+    ).filter(Sale.customer_id.in_(customer_ids)).group_by(Sale.customer_id).all()
+    return {customer_id: (orders, spent or 0, last) for customer_id, orders, spent, last in rows}
+
+class Return(ISOTimestampMixin, db.Model):
     __tablename__ = 'returns'
     
     id = db.Column(db.Integer, primary_key=True)
@@ -254,17 +387,19 @@ class Return(db.Model):
     sale = db.relationship('Sale', backref='returns')
     
     def to_dict(self):
+        sale = self.sale
+        customer = sale.customer if sale else None
         return {
             'id': self.id,
             'return_number': self.return_number,
             'sale_id': self.sale_id,
-            'sale_number': self.sale.sale_number if self.sale else None,
+            'sale_number': sale.sale_number if sale else None,
             'customer_id': self.customer_id,
-            'customer_name': self.sale.customer.name if self.sale and self.sale.customer else 'Walk-in Customer',
+            'customer_name': customer.name if customer else 'Walk-in Customer',
             'total_refund_amount': self.total_refund_amount,
             'reason': self.reason,
             'status': self.status,
-            'created_at': self.created_at.isoformat() + "Z",
+            'created_at': self.created_at_iso,
             'items': [item.to_dict() for item in self.items]
         }
 
@@ -272,8 +407,8 @@ class ReturnItem(db.Model):
     __tablename__ = 'return_items'
     
     id = db.Column(db.Integer, primary_key=True)
-    return_id = db.Column(db.Integer, db.ForeignKey('returns.id'), nullable=False)
-    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
+    return_id = db.Column(db.Integer, db.ForeignKey('returns.id'), nullable=False, index=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False, index=True)
     batch_id = db.Column(db.Integer, db.ForeignKey('product_batches.id'), nullable=True)
     quantity = db.Column(db.Integer, nullable=False)
     unit_price = db.Column(db.Float, nullable=False)
@@ -283,23 +418,24 @@ class ReturnItem(db.Model):
     product = db.relationship('Product', backref='return_items')
     
     def to_dict(self):
+        product = self.product
         return {
             'id': self.id,
             'return_id': self.return_id,
             'product_id': self.product_id,
             'batch_id': self.batch_id,
-            'product_name': self.product.name if self.product else None,
+            'product_name': product.name if product else None,
             'quantity': self.quantity,
             'unit_price': self.unit_price,
             'total_price': self.total_price
         }
 
-class CreditNote(db.Model):
+class CreditNote(ISOTimestampMixin, db.Model):
     __tablename__ = 'credit_notes'
     
     id = db.Column(db.Integer, primary_key=True)
     credit_note_number = db.Column(db.String(50), unique=True, nullable=False)
-    customer_id = db.Column(db.Integer, db.ForeignKey('customers.id'), nullable=False)
+    customer_id = db.Column(db.Integer, db.ForeignKey('customers.id'), nullable=False, index=True)
     return_id = db.Column(db.Integer, db.ForeignKey('returns.id'))
     initial_amount = db.Column(db.Float, nullable=False)
     remaining_amount = db.Column(db.Float, nullable=False)
@@ -312,15 +448,130 @@ class CreditNote(db.Model):
     return_record = db.relationship('Return', backref='credit_note')
 
     def to_dict(self):
+        customer = self.customer
         return {
             'id': self.id,
             'credit_note_number': self.credit_note_number,
             'customer_id': self.customer_id,
-            'customer_name': self.customer.name if self.customer else None,
+            'customer_name': customer.name if customer else None,
             'return_id': self.return_id,
             'initial_amount': self.initial_amount,
             'remaining_amount': self.remaining_amount,
             'status': self.status,
-            'created_at': self.created_at.isoformat() + "Z",
+            'created_at': self.created_at_iso,
             'expires_at': self.expires_at.isoformat() + "Z" if self.expires_at else None
-        }
\ No newline at end of file
+        }
+
+class Counter(db.Model):
+    """Denormalized row counts kept current by SQLite triggers"""
+    __tablename__ = 'counters'
+    
+    name = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.Integer, nullable=False, default=0)
+
+class CustomerTotal(db.Model):
+    """Per-customer lifetime sales total kept current by SQLite triggers"""
+    __tablename__ = 'customer_totals'
+    
+    customer_id = db.Column(db.Integer, primary_key=True)
+    total_spent = db.Column(db.Float, nullable=False, default=0.0)
+
+class DuplicateCandidate(db.Model):
+    """Precomputed duplicate customer group (email, phone or name prefix)"""
+    __tablename__ = 'duplicate_candidates'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    type = db.Column(db.String(10), nullable=False)  # email, phone, name
+    key = db.Column(db.String(200), nullable=False)
+    customer_ids = db.Column(db.JSON, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+def _bump(name, delta='+ 1'):
+    return f"BEGIN UPDATE counters SET value = value {delta} WHERE name = '{name}'; END"
+
+# Kept in metadata.info so init_db's schema fingerprint changes with them
+SQLITE_DDL = db.metadata.info.setdefault('ddl', [])
+SQLITE_DDL.extend([
+    "INSERT OR IGNORE INTO counters (name, value) SELECT 'customers', COUNT(*) FROM customers",
+    "CREATE TRIGGER IF NOT EXISTS customers_count_ai AFTER INSERT ON customers " + _bump('customers'),
+    "CREATE TRIGGER IF NOT EXISTS customers_count_ad AFTER DELETE ON customers " + _bump('customers', '- 1'),
+    # categories_version changes whenever the /categories payload would,
+    # so it can serve as that endpoint's ETag
+    "INSERT OR IGNORE INTO counters (name, value) VALUES ('categories_version', 0)",
+    "CREATE TRIGGER IF NOT EXISTS categories_version_ai AFTER INSERT ON categories " + _bump('categories_version'),
+    "CREATE TRIGGER IF NOT EXISTS categories_version_au AFTER UPDATE ON categories " + _bump('categories_version'),
+    "CREATE TRIGGER IF NOT EXISTS categories_version_ad AFTER DELETE ON categories " + _bump('categories_version'),
+    "CREATE TRIGGER IF NOT EXISTS categories_version_pai AFTER INSERT ON products " + _bump('categories_version'),
+    "CREATE TRIGGER IF NOT EXISTS categories_version_pau AFTER UPDATE OF category_id ON products " + _bump('categories_version'),
+    "CREATE TRIGGER IF NOT EXISTS categories_version_pad AFTER DELETE ON products " + _bump('categories_version'),
+    # customer_totals follows every sale insert, delete, reassignment and amount change
+    "INSERT OR REPLACE INTO customer_totals (customer_id, total_spent) "
+    "SELECT customer_id, SUM(total_amount) FROM sales WHERE customer_id IS NOT NULL GROUP BY customer_id",
+    "CREATE TRIGGER IF NOT EXISTS customer_totals_ai AFTER INSERT ON sales WHEN new.customer_id IS NOT NULL BEGIN "
+    "INSERT INTO customer_totals (customer_id, total_spent) VALUES (new.customer_id, new.total_amount) "
+    "ON CONFLICT (customer_id) DO UPDATE SET total_spent = total_spent + excluded.total_spent; END",
+    "CREATE TRIGGER IF NOT EXISTS customer_totals_ad AFTER DELETE ON sales WHEN old.customer_id IS NOT NULL BEGIN "
+    "UPDATE customer_totals SET total_spent = total_spent - old.total_amount WHERE customer_id = old.customer_id; END",
+    "CREATE TRIGGER IF NOT EXISTS customer_totals_au AFTER UPDATE OF customer_id, total_amount ON sales BEGIN "
+    "UPDATE customer_totals SET total_spent = total_spent - old.total_amount WHERE customer_id = old.customer_id; "
+    "INSERT INTO customer_totals (customer_id, total_spent) SELECT new.customer_id, new.total_amount "
+    "WHERE new.customer_id IS NOT NULL "
+    "ON CONFLICT (customer_id) DO UPDATE SET total_spent = total_spent + excluded.total_spent; END",
+    "CREATE TRIGGER IF NOT EXISTS customer_totals_cd AFTER DELETE ON customers BEGIN "
+    "DELETE FROM customer_totals WHERE customer_id = old.id; END",
+    # Superseded by ix_sales_customer_created
+    "DROP INDEX IF EXISTS ix_sales_customer_id",
+    # customers_version changes whenever a customer row or running total does,
+    # keying caches of customer-derived results
+    "INSERT OR IGNORE INTO counters (name, value) VALUES ('customers_version', 0)",
+    "CREATE TRIGGER IF NOT EXISTS customers_version_ai AFTER INSERT ON customers " + _bump('customers_version'),
+    "CREATE TRIGGER IF NOT EXISTS customers_version_au AFTER UPDATE ON customers " + _bump('customers_version'),
+    "CREATE TRIGGER IF NOT EXISTS customers_version_ad AFTER DELETE ON customers " + _bump('customers_version'),
+    "CREATE TRIGGER IF NOT EXISTS customers_version_tai AFTER INSERT ON customer_totals " + _bump('customers_version'),
+    "CREATE TRIGGER IF NOT EXISTS customers_version_tau AFTER UPDATE ON customer_totals " + _bump('customers_version'),
+    # customer_keys_version changes only when a customer's name, email or
+    # phone can have moved between duplicate groups, not on every sale
+    "INSERT OR IGNORE INTO counters (name, value) VALUES ('customer_keys_version', 0)",
+    "CREATE TRIGGER IF NOT EXISTS customer_keys_version_ai AFTER INSERT ON customers " + _bump('customer_keys_version'),
+    "CREATE TRIGGER IF NOT EXISTS customer_keys_version_au AFTER UPDATE OF name, email, phone ON customers "
+    + _bump('customer_keys_version'),
+    "CREATE TRIGGER IF NOT EXISTS customer_keys_version_ad AFTER DELETE ON customers " + _bump('customer_keys_version'),
+    # inventory_version changes on any product, category name, sale or sale
+    # item write, keying caches of the inventory analytics endpoints
+    "INSERT OR IGNORE INTO counters (name, value) VALUES ('inventory_version', 0)",
+    "CREATE TRIGGER IF NOT EXISTS inventory_version_pai AFTER INSERT ON products " + _bump('inventory_version'),
+    "CREATE TRIGGER IF NOT EXISTS inventory_version_pau AFTER UPDATE ON products " + _bump('inventory_version'),
+    "CREATE TRIGGER IF NOT EXISTS inventory_version_pad AFTER DELETE ON products " + _bump('inventory_version'),
+    "CREATE TRIGGER IF NOT EXISTS inventory_version_cau AFTER UPDATE OF name ON categories " + _bump('inventory_version'),
+    "CREATE TRIGGER IF NOT EXISTS inventory_version_sai AFTER INSERT ON sales " + _bump('inventory_version'),
+    "CREATE TRIGGER IF NOT EXISTS inventory_version_sau AFTER UPDATE ON sales " + _bump('inventory_version'),
+    "CREATE TRIGGER IF NOT EXISTS inventory_version_sad AFTER DELETE ON sales " + _bump('inventory_version'),
+    "CREATE TRIGGER IF NOT EXISTS inventory_version_iai AFTER INSERT ON sale_items " + _bump('inventory_version'),
+    "CREATE TRIGGER IF NOT EXISTS inventory_version_iau AFTER UPDATE ON sale_items " + _bump('inventory_version'),
+    "CREATE TRIGGER IF NOT EXISTS inventory_version_iad AFTER DELETE ON sale_items " + _bump('inventory_version'),
+])
+
+# Trigram full-text index so customer substring search avoids a table scan;
+# the trigram tokenizer needs SQLite 3.34+
+CUSTOMER_FTS = sqlite3.sqlite_version_info >= (3, 34, 0)
+if CUSTOMER_FTS:
+    SQLITE_DDL.extend([
+        "CREATE VIRTUAL TABLE IF NOT EXISTS customers_fts USING fts5("
+        "name, email, phone, content='customers', content_rowid='id', tokenize='trigram')",
+        "INSERT INTO customers_fts (customers_fts) VALUES ('rebuild')",
+        "CREATE TRIGGER IF NOT EXISTS customers_fts_ai AFTER INSERT ON customers BEGIN "
+        "INSERT INTO customers_fts (rowid, name, email, phone) VALUES (new.id, new.name, new.email, new.phone); END",
+        "CREATE TRIGGER IF NOT EXISTS customers_fts_ad AFTER DELETE ON customers BEGIN "
+        "INSERT INTO customers_fts (customers_fts, rowid, name, email, phone) "
+        "VALUES ('delete', old.id, old.name, old.email, old.phone); END",
+        "CREATE TRIGGER IF NOT EXISTS customers_fts_au AFTER UPDATE ON customers BEGIN "
+        "INSERT INTO customers_fts (customers_fts, rowid, name, email, phone) "
+        "VALUES ('delete', old.id, old.name, old.email, old.phone); "
+        "INSERT INTO customers_fts (rowid, name, email, phone) VALUES (new.id, new.name, new.email, new.phone); END",
+    ])
+
+@event.listens_for(db.metadata, 'after_create')
+def create_sqlite_objects(target, connection, **kw):
+    """Backfill counters and install the triggers and indexes listed in SQLITE_DDL"""
+    for statement in SQLITE_DDL:
+        connection.execute(text(statement))
\ No newline at end of file
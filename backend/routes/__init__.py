@@ -2,48 +2,39 @@
 Routes package initialization
 """
 
-# Import all blueprints
-from .products import products_bp
-from .sales import sales_bp
-from .customers import customers_bp
-from .inventory import inventory_bp
-from .reports import reports_bp
-from .categories import categories_bp
-from .settings import settings_bp
-from .purchases import purchases_bp
-from .returns import returns_bp
-from .credit_notes import credit_notes_bp
-from .database_viewer import database_viewer_bp
+import importlib
+
+# (module, blueprint attribute) pairs, imported when the blueprints are registered
+BLUEPRINTS = (
+    ('products', 'products_bp'),
+    ('sales', 'sales_bp'),
+    ('customers', 'customers_bp'),
+    ('inventory', 'inventory_bp'),
+    ('reports', 'reports_bp'),
+    ('categories', 'categories_bp'),
+    ('settings', 'settings_bp'),
+    ('purchases', 'purchases_bp'),
+    ('returns', 'returns_bp'),
+    ('credit_notes', 'credit_notes_bp'),
+    ('database_viewer', 'database_viewer_bp'),
+)
+
+def _load_blueprint(module_name, attr):
+    """Import a route module and return its blueprint"""
+    return getattr(importlib.import_module(f'.{module_name}', __name__), attr)
 
 def register_blueprints(app):
     """Register all blueprints with the Flask application"""
-    
-    # Register blueprints with URL prefixes
-    app.register_blueprint(products_bp, url_prefix='/api')
-    app.register_blueprint(sales_bp, url_prefix='/api')
-    app.register_blueprint(customers_bp, url_prefix='/api')
-    app.register_blueprint(inventory_bp, url_prefix='/api')
-    app.register_blueprint(reports_bp, url_prefix='/api')
-    app.register_blueprint(categories_bp, url_prefix='/api')
-    app.register_blueprint(settings_bp, url_prefix='/api')
-    app.register_blueprint(purchases_bp, url_prefix='/api')
-    app.register_blueprint(returns_bp, url_prefix='/api')
-    app.register_blueprint(credit_notes_bp, url_prefix='/api')
-    app.register_blueprint(database_viewer_bp, url_prefix='/api')
-    
-    print("All blueprints registered successfully")
+    for module_name, attr in BLUEPRINTS:
+        app.register_blueprint(_load_blueprint(module_name, attr), url_prefix='/api')
+
+    app.logger.debug("Registered %d blueprints", len(BLUEPRINTS))
+
+def __getattr__(name):
+    """Keep `from routes import products_bp` working without eager imports"""
+    for module_name, attr in BLUEPRINTS:
+        if attr == name:
+            return _load_blueprint(module_name, attr)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-__all__ = [
-    'products_bp',
-    'sales_bp', 
-    'customers_bp',
-    'inventory_bp',
-    'reports_bp',
-    'categories_bp',
-    'settings_bp',
-    'purchases_bp',
-    'returns_bp',
-    'credit_notes_bp',
-    'database_viewer_bp',
-    'register_blueprints'
-]
\ No newline at end of file
+__all__ = [attr for _, attr in BLUEPRINTS] + ['register_blueprints']
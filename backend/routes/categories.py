@@ -1,45 +1,70 @@
 
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, current_app, request
+from functools import lru_cache
 from database import db
-from models import Category, Product
+from models import Category, Counter, Product
 from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from utils.helpers import ojsonify
+import orjson
 
 categories_bp = Blueprint('categories', __name__)
 
+def _is_duplicate_name(error):
+    """Whether an IntegrityError came from one of the category name unique constraints"""
+    message = str(error.orig)
+    return 'uq_categories_name_lower' in message or 'categories.name' in message
+
+def _build_categories_body():
+    """Encode the category list with product counts as JSON bytes"""
+    # Query categories and join with products to get counts efficiently
+    categories_with_counts = db.session.query(
+        Category, func.count(Product.id).label('product_count')
+    ).outerjoin(Product, Category.id == Product.category_id).group_by(Category.id).order_by(Category.name).all()
+
+    categories_list = [
+        category.to_dict(product_count=product_count)
+        for category, product_count in categories_with_counts
+    ]
+    return orjson.dumps({'success': True, 'data': categories_list})
+
+@lru_cache(maxsize=4)
+def _cached_categories_body(version):
+    """Memoize the encoded list per categories_version"""
+    return _build_categories_body()
+
 @categories_bp.route('/categories', methods=['GET'])
 def get_categories():
     """Get all categories with their product counts"""
     try:
-        # Query categories and join with products to get counts efficiently
-        categories_with_counts = db.session.query(
-            Category, func.count(Product.id).label('product_count')
-        ).outerjoin(Product, Category.id == Product.category_id).group_by(Category.id).order_by(Category.name).all()
-
-        categories_list = []
-        for category, product_count in categories_with_counts:
-            # Use the to_dict() method from the model and update the product_count
-            cat_dict = category.to_dict()
-            cat_dict['product_count'] = product_count
-            categories_list.append(cat_dict)
-
-        return jsonify({
-            'success': True,
-            'data': categories_list
-        })
+        # Triggers bump categories_version on any change that affects this list
+        version = db.session.query(Counter.value).filter_by(name='categories_version').scalar()
+        if version is None:
+            return current_app.response_class(_build_categories_body(), mimetype='application/json')
+        
+        etag = f'categories-{version}'
+        if etag in request.if_none_match:
+            response = current_app.response_class(status=304)
+        else:
+            response = current_app.response_class(_cached_categories_body(version), mimetype='application/json')
+        response.set_etag(etag)
+        # Clients may store the list but must revalidate it with the ETag
+        response.cache_control.no_cache = True
+        return response
     except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
+        return ojsonify({'success': False, 'error': str(e)}), 500
 
 @categories_bp.route('/categories/<int:category_id>', methods=['GET'])
 def get_category(category_id):
     """Get a single category by its ID"""
     try:
         category = Category.query.get_or_404(category_id)
-        return jsonify({
+        return ojsonify({
             'success': True,
             'data': category.to_dict()
         })
     except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
+        return ojsonify({'success': False, 'error': str(e)}), 500
 
 @categories_bp.route('/categories', methods=['POST'])
 def create_category():
@@ -48,34 +73,36 @@ def create_category():
         data = request.get_json()
         
         if not data or not data.get('name'):
-            return jsonify({'success': False, 'error': 'Category name is required'}), 400
+            return ojsonify({'success': False, 'error': 'Category name is required'}), 400
         
         name = data['name'].strip()
         
-        # Check if category name already exists (case-insensitive)
-        existing_category = Category.query.filter(func.lower(Category.name) == func.lower(name)).first()
-        if existing_category:
-            return jsonify({
-                'success': False, 
-                'error': 'A category with this name already exists.'
-            }), 409 # 409 Conflict is suitable here
-        
         new_category = Category(
             name=name,
             description=data.get('description', '').strip()
         )
         
+        # The case-insensitive unique index rejects duplicate names
         db.session.add(new_category)
-        db.session.commit()
+        try:
+            db.session.commit()
+        except IntegrityError as e:
+            db.session.rollback()
+            if not _is_duplicate_name(e):
+                raise
+            return ojsonify({
+                'success': False, 
+                'error': 'A category with this name already exists.'
+            }), 409 # 409 Conflict is suitable here
         
-        return jsonify({
+        return ojsonify({
             'success': True,
-            'data': new_category.to_dict(),
+            'data': new_category.to_dict(product_count=0),
             'message': 'Category created successfully.'
         }), 201
     except Exception as e:
         db.session.rollback()
-        return jsonify({'success': False, 'error': str(e)}), 500
+        return ojsonify({'success': False, 'error': str(e)}), 500
 
 @categories_bp.route('/categories/<int:category_id>', methods=['PUT'])
 def update_category(category_id):
@@ -85,33 +112,34 @@ def update_category(category_id):
         data = request.get_json()
         
         if not data:
-            return jsonify({'success': False, 'error': 'No update data provided.'}), 400
+            return ojsonify({'success': False, 'error': 'No update data provided.'}), 400
             
         if 'name' in data:
-            name = data['name'].strip()
-            if name.lower() != category.name.lower():
-                # Check if the new name already exists in another category
-                existing_category = Category.query.filter(func.lower(Category.name) == func.lower(name)).first()
-                if existing_category:
-                    return jsonify({
-                        'success': False, 
-                        'error': 'A category with this name already exists.'
-                    }), 409
-                category.name = name
+            category.name = data['name'].strip()
         
         if 'description' in data:
             category.description = data.get('description', '').strip()
         
-        db.session.commit()
+        # A name clashing with another category fails the unique index
+        try:
+            db.session.commit()
+        except IntegrityError as e:
+            db.session.rollback()
+            if not _is_duplicate_name(e):
+                raise
+            return ojsonify({
+                'success': False, 
+                'error': 'A category with this name already exists.'
+            }), 409
         
-        return jsonify({
+        return ojsonify({
             'success': True,
             'data': category.to_dict(),
             'message': 'Category updated successfully.'
         })
     except Exception as e:
         db.session.rollback()
-        return jsonify({'success': False, 'error': str(e)}), 500
+        return ojsonify({'success': False, 'error': str(e)}), 500
 
 @categories_bp.route('/categories/<int:category_id>', methods=['DELETE'])
 def delete_category(category_id):
@@ -119,20 +147,22 @@ def delete_category(category_id):
     try:
         category = Category.query.get_or_404(category_id)
         
-        # Prevent deletion if the category is associated with any products
-        if category.products:
-            return jsonify({
+        # Prevent deletion if the category is associated with any products;
+        # EXISTS stops at the first match and the count only runs on refusal
+        products = Product.query.filter_by(category_id=category_id)
+        if db.session.query(products.exists()).scalar():
+            return ojsonify({
                 'success': False, 
-                'error': f'Cannot delete category. It is associated with {len(category.products)} product(s).'
+                'error': f'Cannot delete category. It is associated with {products.count()} product(s).'
             }), 400
         
         db.session.delete(category)
         db.session.commit()
         
-        return jsonify({
+        return ojsonify({
             'success': True,
             'message': 'Category deleted successfully.'
         })
     except Exception as e:
         db.session.rollback()
-        return jsonify({'success': False, 'error': str(e)}), 500
+        return ojsonify({'success': False, 'error': str(e)}), 500
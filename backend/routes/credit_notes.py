@@ -1,5 +1,6 @@
 
-from flask import Blueprint, jsonify
+from flask import Blueprint, request
+from utils.helpers import ojsonify
 
 credit_notes_bp = Blueprint('credit_notes', __name__)
 
@@ -10,4 +11,6 @@ def get_credit_notes():
     # from models import CreditNote
     # credit_notes = CreditNote.query.all()
     # data = [cn.to_dict() for cn in credit_notes]
-    return jsonify({'success': True, 'data': []})
\ No newline at end of file
+    response = ojsonify({'success': True, 'data': []})
+    response.add_etag()
+    return response.make_conditional(request)
\ No newline at end of file
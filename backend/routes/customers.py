@@ -1,12 +1,42 @@
-from flask import Blueprint, request, jsonify
-from database import db
-from models import Customer, Sale, SaleItem, Product
+from flask import Blueprint, Response, request, stream_with_context
+from database import db, bulk_insert
+from models import Customer, CustomerTotal, DuplicateCandidate, Sale, SaleItem, Product, Category, Counter, CUSTOMER_FTS, CUSTOMER_HAS_PHONE, CUSTOMER_NAME_PREFIX, compute_customer_totals, compute_customer_sale_stats
 from datetime import datetime, timedelta
-from sqlalchemy import func, and_, or_, desc, asc
+from sqlalchemy import func, and_, or_, desc, asc, case, cast, column, literal, select, text, union_all, Integer
 from collections import defaultdict
+from sqlalchemy.orm import selectinload
+from utils.cache import cache
+from utils.helpers import InvalidCursor, keyset_paginate, ojsonify
+import orjson
 
 customers_bp = Blueprint('customers', __name__)
 
+# Rows fetched and written per step when streaming exports
+EXPORT_CHUNK_SIZE = 500
+
+ANALYTICS_CACHE_TTL = 120  # seconds; entries are also keyed on customers_version
+DUPLICATES_CACHE_TTL = 600  # seconds; entries are also keyed on customers_version
+
+_analytics_cache_version = None  # customers_version of the analytics entries currently cached
+
+# Built once; only the bound phrase changes per request, so SQLAlchemy's
+# compiled-statement cache is hit on every search
+_CUSTOMER_FTS_MATCH = text(
+    'SELECT rowid FROM customers_fts WHERE customers_fts MATCH :phrase'
+).columns(column('rowid'))
+
+def _customer_search_filter(term):
+    """Match customers whose name, email or phone contains term"""
+    # The trigram index only covers terms of three or more characters
+    if CUSTOMER_FTS and len(term) >= 3:
+        phrase = '"' + term.replace('"', '""') + '"'
+        return Customer.id.in_(_CUSTOMER_FTS_MATCH.bindparams(phrase=phrase))
+    return or_(
+        Customer.name.contains(term),
+        Customer.email.contains(term),
+        Customer.phone.contains(term)
+    )
+
 @customers_bp.route('/customers', methods=['GET'])
 def get_customers():
     """Get all customers with pagination and search"""
@@ -16,18 +46,14 @@ def get_customers():
         search = request.args.get('search', '')
         sort_by = request.args.get('sort_by', 'name')  # name, email, created_at, total_spent
         sort_order = request.args.get('sort_order', 'asc')  # asc, desc
+        # Passing cursor (empty for the first page) switches to keyset paging
+        cursor = request.args.get('cursor')
         
         query = Customer.query
         
         # Search filter
         if search:
-            query = query.filter(
-                or_(
-                    Customer.name.contains(search),
-                    Customer.email.contains(search),
-                    Customer.phone.contains(search)
-                )
-            )
+            query = query.filter(_customer_search_filter(search))
         
         # Sorting
         if sort_by == 'name':
@@ -39,24 +65,40 @@ def get_customers():
         else:
             order_column = Customer.name
         
-        if sort_order == 'desc':
-            query = query.order_by(desc(order_column))
+        if cursor is not None:
+            try:
+                items, next_cursor = keyset_paginate(
+                    query, order_column, Customer.id, cursor,
+                    per_page, descending=(sort_order == 'desc')
+                )
+            except InvalidCursor as e:
+                return ojsonify({'success': False, 'error': str(e)}), 400
+            pagination = {'per_page': per_page, 'next_cursor': next_cursor}
         else:
-            query = query.order_by(asc(order_column))
+            if sort_order == 'desc':
+                query = query.order_by(desc(order_column))
+            else:
+                query = query.order_by(asc(order_column))
+            
+            customers = query.paginate(
+                page=page, per_page=per_page, error_out=False
+            )
+            items = customers.items
+            pagination = {
+                'page': page,
+                'pages': customers.pages,
+                'per_page': per_page,
+                'total': customers.total
+            }
         
-        customers = query.paginate(
-            page=page, per_page=per_page, error_out=False
-        )
+        # Purchase statistics for the whole page in one GROUP BY
+        stats = compute_customer_sale_stats([c.id for c in items])
         
         # Enhance customer data with purchase statistics
         enhanced_customers = []
-        for customer in customers.items:
-            customer_dict = customer.to_dict()
-            
-            # Get purchase statistics
-            total_orders = Sale.query.filter_by(customer_id=customer.id).count()
-            total_spent = db.session.query(func.sum(Sale.total_amount)).filter_by(customer_id=customer.id).scalar() or 0
-            last_purchase = db.session.query(func.max(Sale.created_at)).filter_by(customer_id=customer.id).scalar()
+        for customer in items:
+            total_orders, total_spent, last_purchase = stats.get(customer.id, (0, 0, None))
+            customer_dict = customer.to_dict(total_purchases=total_spent)
             
             customer_dict.update({
                 'total_orders': total_orders,
@@ -68,59 +110,54 @@ def get_customers():
             
             enhanced_customers.append(customer_dict)
         
-        return jsonify({
+        return ojsonify({
             'success': True,
             'data': enhanced_customers,
-            'pagination': {
-                'page': page,
-                'pages': customers.pages,
-                'per_page': per_page,
-                'total': customers.total
-            }
+            'pagination': pagination
         })
     except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
+        return ojsonify({'success': False, 'error': str(e)}), 500
 
 @customers_bp.route('/customers/<int:customer_id>', methods=['GET'])
 def get_customer(customer_id):
     """Get single customer with detailed information"""
     try:
         customer = Customer.query.get_or_404(customer_id)
-        customer_dict = customer.to_dict()
-        
-        # Get detailed purchase history
-        sales = Sale.query.filter_by(customer_id=customer_id).order_by(desc(Sale.created_at)).all()
-        
-        # Calculate statistics
-        total_orders = len(sales)
-        total_spent = sum(sale.total_amount for sale in sales)
-        total_items_purchased = sum(sum(item.quantity for item in sale.items) for sale in sales)
-        
-        # Get favorite products
-        product_purchases = defaultdict(lambda: {'quantity': 0, 'total_spent': 0})
-        for sale in sales:
-            for item in sale.items:
-                if item.product:
-                    product_purchases[item.product.name]['quantity'] += item.quantity
-                    product_purchases[item.product.name]['total_spent'] += item.total_price
-        
-        favorite_products = sorted(
-            [
-                {
-                    'product_name': name,
-                    'quantity_purchased': data['quantity'],
-                    'total_spent': data['total_spent']
-                }
-                for name, data in product_purchases.items()
-            ],
-            key=lambda x: x['quantity_purchased'],
-            reverse=True
-        )[:5]
+        
+        # Calculate statistics in the database rather than loading every sale
+        total_orders, total_spent, first_purchase, last_purchase = db.session.query(
+            func.count(Sale.id),
+            func.coalesce(func.sum(Sale.total_amount), 0),
+            func.min(Sale.created_at),
+            func.max(Sale.created_at)
+        ).filter(Sale.customer_id == customer_id).one()
+        total_items_purchased = db.session.query(
+            func.coalesce(func.sum(SaleItem.quantity), 0)
+        ).join(Sale, Sale.id == SaleItem.sale_id).filter(Sale.customer_id == customer_id).scalar()
+        
+        customer_dict = customer.to_dict(total_purchases=total_spent)
+        
+        # Get favorite products (top 5 by quantity, aggregated in the database)
+        quantity_purchased = func.sum(SaleItem.quantity)
+        product_purchases = db.session.query(
+            Product.name,
+            quantity_purchased,
+            func.sum(SaleItem.total_price)
+        ).join(SaleItem, SaleItem.product_id == Product.id).join(Sale, Sale.id == SaleItem.sale_id).filter(
+            Sale.customer_id == customer_id
+        ).group_by(Product.name).order_by(desc(quantity_purchased)).limit(5).all()
+        
+        favorite_products = [
+            {
+                'product_name': name,
+                'quantity_purchased': quantity,
+                'total_spent': total_spent
+            }
+            for name, quantity, total_spent in product_purchases
+        ]
         
         # Purchase frequency analysis
-        if len(sales) > 1:
-            first_purchase = min(sale.created_at for sale in sales)
-            last_purchase = max(sale.created_at for sale in sales)
+        if total_orders > 1:
             customer_lifetime_days = (last_purchase - first_purchase).days
             purchase_frequency = total_orders / max(customer_lifetime_days, 1) if customer_lifetime_days > 0 else 0
         else:
@@ -128,7 +165,10 @@ def get_customer(customer_id):
             customer_lifetime_days = 0
         
         # Recent purchases (last 5)
-        recent_purchases = [sale.to_dict() for sale in sales[:5]]
+        recent_sales = Sale.query.options(
+            selectinload(Sale.items).selectinload(SaleItem.product)
+        ).filter_by(customer_id=customer_id).order_by(desc(Sale.created_at)).limit(5).all()
+        recent_purchases = [sale.to_dict() for sale in recent_sales]
         
         customer_dict.update({
             'statistics': {
@@ -138,19 +178,19 @@ def get_customer(customer_id):
                 'average_order_value': total_spent / total_orders if total_orders > 0 else 0,
                 'customer_lifetime_days': customer_lifetime_days,
                 'purchase_frequency': purchase_frequency,
-                'first_purchase': sales[-1].created_at.isoformat() if sales else None,
-                'last_purchase': sales[0].created_at.isoformat() if sales else None
+                'first_purchase': first_purchase.isoformat() if first_purchase else None,
+                'last_purchase': last_purchase.isoformat() if last_purchase else None
             },
             'favorite_products': favorite_products,
             'recent_purchases': recent_purchases
         })
         
-        return jsonify({
+        return ojsonify({
             'success': True,
             'data': customer_dict
         })
     except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
+        return ojsonify({'success': False, 'error': str(e)}), 500
 
 @customers_bp.route('/customers', methods=['POST'])
 def create_customer():
@@ -162,7 +202,7 @@ def create_customer():
         required_fields = ['name']
         for field in required_fields:
             if not data.get(field):
-                return jsonify({
+                return ojsonify({
                     'success': False,
                     'error': f'{field} is required'
                 }), 400
@@ -171,7 +211,7 @@ def create_customer():
         if data.get('email'):
             existing_customer = Customer.query.filter_by(email=data['email']).first()
             if existing_customer:
-                return jsonify({
+                return ojsonify({
                     'success': False,
                     'error': 'Customer with this email already exists'
                 }), 400
@@ -180,14 +220,14 @@ def create_customer():
         if data.get('gst_number'):
             existing_customer_gst = Customer.query.filter_by(gst_number=data['gst_number']).first()
             if existing_customer_gst:
-                return jsonify({
+                return ojsonify({
                     'success': False,
                     'error': 'Customer with this GST number already exists'
                 }), 400
 
         # Validate email format (basic validation)
         if data.get('email') and '@' not in data['email']:
-            return jsonify({
+            return ojsonify({
                 'success': False,
                 'error': 'Invalid email format'
             }), 400
@@ -205,14 +245,14 @@ def create_customer():
         db.session.add(customer)
         db.session.commit()
         
-        return jsonify({
+        return ojsonify({
             'success': True,
             'data': customer.to_dict(),
             'message': 'Customer created successfully'
         }), 201
     except Exception as e:
         db.session.rollback()
-        return jsonify({'success': False, 'error': str(e)}), 500
+        return ojsonify({'success': False, 'error': str(e)}), 500
 
 @customers_bp.route('/customers/<int:customer_id>', methods=['PUT'])
 def update_customer(customer_id):
@@ -225,7 +265,7 @@ def update_customer(customer_id):
         if 'email' in data and data['email'] and data['email'] != customer.email:
             existing_customer = Customer.query.filter_by(email=data['email']).first()
             if existing_customer:
-                return jsonify({
+                return ojsonify({
                     'success': False,
                     'error': 'Customer with this email already exists'
                 }), 400
@@ -234,14 +274,14 @@ def update_customer(customer_id):
         if 'gst_number' in data and data['gst_number'] and data['gst_number'] != customer.gst_number:
             existing_customer_gst = Customer.query.filter_by(gst_number=data['gst_number']).first()
             if existing_customer_gst:
-                return jsonify({
+                return ojsonify({
                     'success': False,
                     'error': 'Customer with this GST number already exists'
                 }), 400
 
         # Validate email format (basic validation)
         if data.get('email') and '@' not in data['email']:
-            return jsonify({
+            return ojsonify({
                 'success': False,
                 'error': 'Invalid email format'
             }), 400
@@ -267,14 +307,14 @@ def update_customer(customer_id):
         
         db.session.commit()
         
-        return jsonify({
+        return ojsonify({
             'success': True,
             'data': customer.to_dict(),
             'message': 'Customer updated successfully'
         })
     except Exception as e:
         db.session.rollback()
-        return jsonify({'success': False, 'error': str(e)}), 500
+        return ojsonify({'success': False, 'error': str(e)}), 500
 
 @customers_bp.route('/customers/<int:customer_id>', methods=['DELETE'])
 def delete_customer(customer_id):
@@ -282,24 +322,25 @@ def delete_customer(customer_id):
     try:
         customer = Customer.query.get_or_404(customer_id)
         
-        # Check if customer has sales
-        sales_count = Sale.query.filter_by(customer_id=customer_id).count()
-        if sales_count > 0:
-            return jsonify({
+        # Check if customer has sales; EXISTS stops at the first match and the
+        # count only runs on refusal
+        sales = Sale.query.filter_by(customer_id=customer_id)
+        if db.session.query(sales.exists()).scalar():
+            return ojsonify({
                 'success': False,
-                'error': f'Cannot delete customer with existing sales records ({sales_count} sales found). Consider archiving instead.'
+                'error': f'Cannot delete customer with existing sales records ({sales.count()} sales found). Consider archiving instead.'
             }), 400
         
         db.session.delete(customer)
         db.session.commit()
         
-        return jsonify({
+        return ojsonify({
             'success': True,
             'message': 'Customer deleted successfully'
         })
     except Exception as e:
         db.session.rollback()
-        return jsonify({'success': False, 'error': str(e)}), 500
+        return ojsonify({'success': False, 'error': str(e)}), 500
 
 @customers_bp.route('/customers/<int:customer_id>/purchases', methods=['GET'])
 def get_customer_purchases(customer_id):
@@ -311,8 +352,13 @@ def get_customer_purchases(customer_id):
         per_page = request.args.get('per_page', 10, type=int)
         start_date = request.args.get('start_date')
         end_date = request.args.get('end_date')
+        # Passing cursor (empty for the first page) switches to keyset paging
+        cursor = request.args.get('cursor')
         
-        query = Sale.query.filter_by(customer_id=customer_id)
+        # Sale.to_dict reads each item's product name; batch-load them per page
+        query = Sale.query.options(
+            selectinload(Sale.items).selectinload(SaleItem.product)
+        ).filter_by(customer_id=customer_id)
         
         # Date filters
         if start_date:
@@ -320,98 +366,123 @@ def get_customer_purchases(customer_id):
         if end_date:
             query = query.filter(Sale.created_at <= datetime.fromisoformat(end_date))
         
-        sales = query.order_by(desc(Sale.created_at)).paginate(
-            page=page, per_page=per_page, error_out=False
-        )
-        
-        return jsonify({
-            'success': True,
-            'data': {
-                'customer': customer.to_dict(),
-                'purchases': [sale.to_dict() for sale in sales.items]
-            },
-            'pagination': {
+        if cursor is not None:
+            try:
+                items, next_cursor = keyset_paginate(
+                    query, Sale.created_at, Sale.id, cursor,
+                    per_page, descending=True
+                )
+            except InvalidCursor as e:
+                return ojsonify({'success': False, 'error': str(e)}), 400
+            pagination = {'per_page': per_page, 'next_cursor': next_cursor}
+        else:
+            sales = query.order_by(desc(Sale.created_at)).paginate(
+                page=page, per_page=per_page, error_out=False
+            )
+            items = sales.items
+            pagination = {
                 'page': page,
                 'pages': sales.pages,
                 'per_page': per_page,
                 'total': sales.total
             }
+        
+        return ojsonify({
+            'success': True,
+            'data': {
+                'customer': customer.to_dict(),
+                'purchases': [sale.to_dict() for sale in items]
+            },
+            'pagination': pagination
         })
     except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
+        return ojsonify({'success': False, 'error': str(e)}), 500
 
 @customers_bp.route('/customers/analytics', methods=['GET'])
 def get_customer_analytics():
     """Get customer analytics and insights"""
     try:
         days = request.args.get('days', 30, type=int)
-        start_date = datetime.utcnow() - timedelta(days=days)
-        
-        # Total customers
-        total_customers = Customer.query.count()
         
-        # New customers in period
-        new_customers = Customer.query.filter(Customer.created_at >= start_date).count()
+        # Dashboards poll this with the same `days`; serve repeats from cache.
+        # Every input is a customer row or a customer's sale, and those bump
+        # customers_version through the customers and customer_totals triggers.
+        version = db.session.query(Counter.value).filter_by(name='customers_version').scalar()
+        cache_key = f'customer-analytics:v1:{version}:{days}'
+        if version is not None:
+            cached = cache.get(cache_key)
+            if cached is not None:
+                return ojsonify(cached)
         
-        # Active customers (made purchases in period)
-        active_customers = db.session.query(Customer.id).join(Sale).filter(
-            Sale.created_at >= start_date
-        ).distinct().count()
+        start_date = datetime.utcnow() - timedelta(days=days)
         
-        # Customer lifetime value analysis
+        # Total customers (trigger-maintained counter), new customers in period and
+        # active customers (made purchases in period), fetched in one round-trip
+        total_customers, new_customers, active_customers = db.session.query(
+            func.coalesce(
+                select(Counter.value).where(Counter.name == 'customers').scalar_subquery(), 0
+            ),
+            select(func.count(Customer.id)).where(Customer.created_at >= start_date).scalar_subquery(),
+            select(func.count(func.distinct(Sale.customer_id))).join(
+                Customer, Customer.id == Sale.customer_id
+            ).where(Sale.created_at >= start_date).scalar_subquery()
+        ).one()
+        
+        # Customer lifetime value analysis, ranked in the database
         customer_values = db.session.query(
-            Customer.id,
-            Customer.name,
-            func.sum(Sale.total_amount).label('total_spent'),
-            func.count(Sale.id).label('total_orders'),
-            func.max(Sale.created_at).label('last_purchase'),
-            func.min(Sale.created_at).label('first_purchase')
-        ).join(Sale).group_by(Customer.id).all()
+            Sale.customer_id.label('customer_id'),
+            func.sum(Sale.total_amount).label('total_spent')
+        ).join(Customer, Customer.id == Sale.customer_id).group_by(Sale.customer_id).subquery()
+        ranked = db.session.query(
+            customer_values.c.total_spent,
+            (func.row_number().over(order_by=customer_values.c.total_spent.desc()) - 1).label('rank'),
+            func.count().over().label('customer_count')
+        ).subquery()
+        
+        # Define segments (top 20%, middle 30%, bottom 50%) from the spend found
+        # at those ranks, without pulling every customer into Python
+        customer_count, total_clv, high_value_spend, medium_value_spend = db.session.query(
+            func.count(),
+            func.coalesce(func.sum(ranked.c.total_spent), 0),
+            func.max(case((ranked.c.rank == cast(ranked.c.customer_count * 0.2, Integer), ranked.c.total_spent))),
+            func.max(case((ranked.c.rank == cast(ranked.c.customer_count * 0.5, Integer), ranked.c.total_spent)))
+        ).select_from(ranked).one()
         
         # Segment customers by value
-        if customer_values:
-            spending_amounts = [cv.total_spent for cv in customer_values]
-            spending_amounts.sort(reverse=True)
+        if customer_count:
+            high_value_threshold = high_value_spend if customer_count > 5 else 0
+            medium_value_threshold = medium_value_spend if customer_count > 2 else 0
             
-            # Define segments (top 20%, middle 30%, bottom 50%)
-            high_value_threshold = spending_amounts[int(len(spending_amounts) * 0.2)] if len(spending_amounts) > 5 else 0
-            medium_value_threshold = spending_amounts[int(len(spending_amounts) * 0.5)] if len(spending_amounts) > 2 else 0
+            spent = customer_values.c.total_spent
+            high_value, medium_value, low_value = db.session.query(
+                func.sum(case((spent >= high_value_threshold, 1), else_=0)),
+                func.sum(case((and_(spent < high_value_threshold, spent >= medium_value_threshold), 1), else_=0)),
+                func.sum(case((and_(spent < high_value_threshold, spent < medium_value_threshold), 1), else_=0))
+            ).select_from(customer_values).one()
+            segments = {'high_value': high_value, 'medium_value': medium_value, 'low_value': low_value}
             
-            segments = {'high_value': 0, 'medium_value': 0, 'low_value': 0}
-            total_clv = 0
-            
-            for cv in customer_values:
-                total_clv += cv.total_spent
-                if cv.total_spent >= high_value_threshold:
-                    segments['high_value'] += 1
-                elif cv.total_spent >= medium_value_threshold:
-                    segments['medium_value'] += 1
-                else:
-                    segments['low_value'] += 1
-            
-            average_clv = total_clv / len(customer_values)
+            average_clv = total_clv / customer_count
         else:
             segments = {'high_value': 0, 'medium_value': 0, 'low_value': 0}
             average_clv = 0
         
-        # Customer acquisition trend (last 12 months)
-        acquisition_trend = []
-        for i in range(12):
-            month_start = datetime.utcnow().replace(day=1) - timedelta(days=30*i)
-            month_end = month_start + timedelta(days=31)
-            month_end = month_end.replace(day=1) - timedelta(days=1)  # Last day of month
-            
-            new_customers_month = Customer.query.filter(
-                Customer.created_at >= month_start,
-                Customer.created_at <= month_end
-            ).count()
-            
-            acquisition_trend.append({
-                'month': month_start.strftime('%Y-%m'),
-                'new_customers': new_customers_month
-            })
-        
-        acquisition_trend.reverse()  # Chronological order
+        # Customer acquisition trend (last 12 calendar months) in one GROUP BY
+        this_month = datetime.utcnow().date().replace(day=1)
+        months = []
+        for i in range(11, -1, -1):
+            year, month = divmod(this_month.year * 12 + this_month.month - 1 - i, 12)
+            months.append(f'{year:04d}-{month + 1:02d}')
+        
+        month_label = func.strftime('%Y-%m', Customer.created_at)
+        monthly_counts = dict(db.session.query(month_label, func.count(Customer.id)).filter(
+            Customer.created_at >= datetime.strptime(months[0], '%Y-%m')
+        ).group_by(month_label).all())
+        
+        # Months with no sign-ups are backfilled with zero, in chronological order
+        acquisition_trend = [
+            {'month': month, 'new_customers': monthly_counts.get(month, 0)}
+            for month in months
+        ]
         
         # Top customers by spending
         top_customers = db.session.query(
@@ -421,7 +492,7 @@ def get_customer_analytics():
             func.count(Sale.id).label('total_orders')
         ).join(Sale).group_by(Customer.id).order_by(desc('total_spent')).limit(10).all()
         
-        return jsonify({
+        payload = {
             'success': True,
             'data': {
                 'summary': {
@@ -444,9 +515,18 @@ def get_customer_analytics():
                 ],
                 'period_days': days
             }
-        })
+        }
+        if version is not None:
+            global _analytics_cache_version
+            if version != _analytics_cache_version:
+                # Entries for older versions can never be served again
+                cache.delete_prefix('customer-analytics:v1:')
+                _analytics_cache_version = version
+            cache.set(cache_key, payload, ANALYTICS_CACHE_TTL)
+        
+        return ojsonify(payload)
     except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
+        return ojsonify({'success': False, 'error': str(e)}), 500
 
 @customers_bp.route('/customers/search', methods=['GET'])
 def search_customers():
@@ -456,26 +536,21 @@ def search_customers():
         limit = request.args.get('limit', 10, type=int)
         
         if not query:
-            return jsonify({
+            return ojsonify({
                 'success': False,
                 'error': 'Search query is required'
             }), 400
         
-        customers = Customer.query.filter(
-            or_(
-                Customer.name.contains(query),
-                Customer.email.contains(query),
-                Customer.phone.contains(query)
-            )
-        ).limit(limit).all()
+        customers = Customer.query.filter(_customer_search_filter(query)).limit(limit).all()
+        totals = compute_customer_totals([c.id for c in customers])
         
-        return jsonify({
+        return ojsonify({
             'success': True,
-            'data': [customer.to_dict() for customer in customers],
+            'data': [customer.to_dict(total_purchases=totals.get(customer.id, 0)) for customer in customers],
             'count': len(customers)
         })
     except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
+        return ojsonify({'success': False, 'error': str(e)}), 500
 
 @customers_bp.route('/customers/bulk-import', methods=['POST'])
 def bulk_import_customers():
@@ -485,14 +560,20 @@ def bulk_import_customers():
         customers_data = data.get('customers', [])
         
         if not customers_data:
-            return jsonify({
+            return ojsonify({
                 'success': False,
                 'error': 'No customer data provided'
             }), 400
         
         created_customers = []
+        customer_rows = []
         errors = []
         
+        # Look up every email in the import with one IN query instead of per row
+        existing_emails = {email for (email,) in db.session.query(Customer.email).filter(
+            Customer.email.in_([c['email'] for c in customers_data if c.get('email')])
+        )}
+        
         for i, customer_data in enumerate(customers_data):
             try:
                 # Validate required fields
@@ -500,21 +581,19 @@ def bulk_import_customers():
                     errors.append(f'Row {i+1}: Name is required')
                     continue
                 
-                # Check for duplicate email
+                # Check for duplicate email, including earlier rows of this import
                 if customer_data.get('email'):
-                    existing = Customer.query.filter_by(email=customer_data['email']).first()
-                    if existing:
+                    if customer_data['email'] in existing_emails:
                         errors.append(f'Row {i+1}: Email {customer_data["email"]} already exists')
                         continue
+                    existing_emails.add(customer_data['email'])
                 
-                customer = Customer(
-                    name=customer_data['name'].strip(),
-                    email=customer_data.get('email', '').strip() if customer_data.get('email') else None,
-                    phone=customer_data.get('phone', '').strip() if customer_data.get('phone') else None,
-                    address=customer_data.get('address', '').strip() if customer_data.get('address') else None
-                )
-                
-                db.session.add(customer)
+                customer_rows.append({
+                    'name': customer_data['name'].strip(),
+                    'email': customer_data.get('email', '').strip() if customer_data.get('email') else None,
+                    'phone': customer_data.get('phone', '').strip() if customer_data.get('phone') else None,
+                    'address': customer_data.get('address', '').strip() if customer_data.get('address') else None
+                })
                 created_customers.append(customer_data['name'])
                 
             except Exception as e:
@@ -522,14 +601,15 @@ def bulk_import_customers():
         
         if errors:
             db.session.rollback()
-            return jsonify({
+            return ojsonify({
                 'success': False,
                 'errors': errors
             }), 400
         
+        bulk_insert(Customer, customer_rows)
         db.session.commit()
         
-        return jsonify({
+        return ojsonify({
             'success': True,
             'data': {
                 'created_count': len(created_customers),
@@ -539,7 +619,7 @@ def bulk_import_customers():
         })
     except Exception as e:
         db.session.rollback()
-        return jsonify({'success': False, 'error': str(e)}), 500
+        return ojsonify({'success': False, 'error': str(e)}), 500
 
 @customers_bp.route('/customers/<int:customer_id>/loyalty-points', methods=['GET'])
 def get_customer_loyalty_points(customer_id):
@@ -547,8 +627,9 @@ def get_customer_loyalty_points(customer_id):
     try:
         customer = Customer.query.get_or_404(customer_id)
         
-        # Calculate points based on total spending (1 point per dollar spent)
-        total_spent = db.session.query(func.sum(Sale.total_amount)).filter_by(customer_id=customer_id).scalar() or 0
+        # Calculate points based on total spending (1 point per dollar spent),
+        # read from the trigger-maintained running total instead of a SUM
+        total_spent = db.session.query(CustomerTotal.total_spent).filter_by(customer_id=customer_id).scalar() or 0
         points = int(total_spent)  # Simple 1:1 ratio
         
         # Points history (based on sales)
@@ -562,10 +643,10 @@ def get_customer_loyalty_points(customer_id):
             } for sale in sales
         ]
         
-        return jsonify({
+        return ojsonify({
             'success': True,
             'data': {
-                'customer': customer.to_dict(),
+                'customer': customer.to_dict(total_purchases=total_spent),
                 'loyalty_points': {
                     'current_points': points,
                     'total_earned': points,
@@ -577,7 +658,7 @@ def get_customer_loyalty_points(customer_id):
             }
         })
     except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
+        return ojsonify({'success': False, 'error': str(e)}), 500
 
 @customers_bp.route('/customers/<int:customer_id>/recommendations', methods=['GET'])
 def get_customer_recommendations(customer_id):
@@ -620,8 +701,12 @@ def get_customer_recommendations(customer_id):
             # Get categories customer has purchased from
             purchased_categories = list(set(p.category_id for p in purchased_products if p.category_id))
             
-            # Find products in same categories that customer hasn't bought
-            purchased_product_ids = [p.id for p in purchased_products]
+            # Find products in same categories that customer hasn't bought,
+            # as a correlated anti-join rather than an inlined id list
+            already_purchased = db.session.query(SaleItem.id).join(Sale, Sale.id == SaleItem.sale_id).filter(
+                SaleItem.product_id == Product.id,
+                Sale.customer_id == customer_id
+            ).exists()
             
             category_recommendations = db.session.query(
                 Product.id,
@@ -631,7 +716,7 @@ def get_customer_recommendations(customer_id):
                 Category.name.label('category_name')
             ).join(Category).filter(
                 Product.category_id.in_(purchased_categories),
-                ~Product.id.in_(purchased_product_ids),
+                ~already_purchased,
                 Product.is_active == True
             ).limit(5).all()
             
@@ -646,7 +731,7 @@ def get_customer_recommendations(customer_id):
                 } for p in category_recommendations
             ]
         
-        return jsonify({
+        return ojsonify({
             'success': True,
             'data': {
                 'customer': customer.to_dict(),
@@ -655,7 +740,7 @@ def get_customer_recommendations(customer_id):
             }
         })
     except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
+        return ojsonify({'success': False, 'error': str(e)}), 500
 
 @customers_bp.route('/customers/export', methods=['POST'])
 def export_customers():
@@ -665,41 +750,68 @@ def export_customers():
         format_type = data.get('format', 'json')  # json, csv, excel
         include_analytics = data.get('include_analytics', False)
         
-        # Get all customers
-        customers = Customer.query.all()
+        # Get all customers with their sales aggregates in a single scan, as
+        # plain rows (no ORM objects) fetched from the cursor in chunks
+        customers = db.session.execute(
+            select(
+                Customer.id, Customer.name, Customer.email, Customer.phone, Customer.address,
+                Customer.gst_number, Customer.opening_balance, Customer.created_at,
+                func.count(Sale.id),
+                func.coalesce(func.sum(Sale.total_amount), 0),
+                func.max(Sale.created_at)
+            ).outerjoin(Sale, Sale.customer_id == Customer.id).group_by(Customer.id)
+            .execution_options(yield_per=EXPORT_CHUNK_SIZE)
+        )
         
-        export_data = []
-        for customer in customers:
-            customer_data = customer.to_dict()
-            
-            if include_analytics:
-                # Add analytics data
-                total_orders = Sale.query.filter_by(customer_id=customer.id).count()
-                total_spent = db.session.query(func.sum(Sale.total_amount)).filter_by(customer_id=customer.id).scalar() or 0
-                last_purchase = db.session.query(func.max(Sale.created_at)).filter_by(customer_id=customer.id).scalar()
+        def generate():
+            """Stream the export document chunk by chunk"""
+            yield b'{"success":true,"data":['
+            count = 0
+            chunk = []
+            for (customer_id, name, email, phone, address, gst_number, opening_balance, created_at,
+                 total_orders, total_spent, last_purchase) in customers:
+                # Same keys as Customer.to_dict
+                customer_data = {
+                    'id': customer_id,
+                    'name': name,
+                    'email': email,
+                    'phone': phone,
+                    'address': address,
+                    'gst_number': gst_number,
+                    'opening_balance': opening_balance,
+                    'created_at': created_at.isoformat() + "Z" if created_at else None,
+                    'total_purchases': total_spent
+                }
                 
-                customer_data.update({
-                    'total_orders': total_orders,
-                    'total_spent': total_spent,
-                    'average_order_value': total_spent / total_orders if total_orders > 0 else 0,
-                    'last_purchase': last_purchase.isoformat() if last_purchase else None
-                })
+                if include_analytics:
+                    # Add analytics data
+                    customer_data.update({
+                        'total_orders': total_orders,
+                        'total_spent': total_spent,
+                        'average_order_value': total_spent / total_orders if total_orders > 0 else 0,
+                        'last_purchase': last_purchase.isoformat() if last_purchase else None
+                    })
+                
+                chunk.append(orjson.dumps(customer_data))
+                count += 1
+                if len(chunk) == EXPORT_CHUNK_SIZE:
+                    yield (b',' if count > len(chunk) else b'') + b','.join(chunk)
+                    chunk = []
+            if chunk:
+                yield (b',' if count > len(chunk) else b'') + b','.join(chunk)
             
-            export_data.append(customer_data)
-        
-        return jsonify({
-            'success': True,
-            'data': export_data,
-            'metadata': {
-                'total_customers': len(export_data),
+            yield b'],"metadata":' + orjson.dumps({
+                'total_customers': count,
                 'export_format': format_type,
                 'include_analytics': include_analytics,
                 'exported_at': datetime.utcnow().isoformat()
-            },
-            'message': f'Customer data exported successfully ({len(export_data)} customers)'
-        })
+            }) + b',"message":' + orjson.dumps(
+                f'Customer data exported successfully ({count} customers)'
+            ) + b'}'
+        
+        return Response(stream_with_context(generate()), mimetype='application/json')
     except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
+        return ojsonify({'success': False, 'error': str(e)}), 500
 
 @customers_bp.route('/customers/<int:customer_id>/merge', methods=['POST'])
 def merge_customers(customer_id):
@@ -709,19 +821,24 @@ def merge_customers(customer_id):
         target_customer_id = data.get('target_customer_id')
         
         if not target_customer_id:
-            return jsonify({
+            return ojsonify({
                 'success': False,
                 'error': 'Target customer ID is required'
             }), 400
         
         if customer_id == target_customer_id:
-            return jsonify({
+            return ojsonify({
                 'success': False,
                 'error': 'Cannot merge customer with itself'
             }), 400
         
-        source_customer = Customer.query.get_or_404(customer_id)
-        target_customer = Customer.query.get_or_404(target_customer_id)
+        # Take SQLite's write lock before reading, so no sale can be attributed
+        # to the source customer between moving its sales and deleting it.
+        # FOR UPDATE is a no-op on SQLite but locks the rows on other backends.
+        if db.engine.dialect.name == 'sqlite':
+            db.session.execute(text('BEGIN IMMEDIATE'))
+        source_customer = Customer.query.with_for_update().get_or_404(customer_id)
+        target_customer = Customer.query.with_for_update().get_or_404(target_customer_id)
         
         # Move all sales from source to target customer
         Sale.query.filter_by(customer_id=customer_id).update({'customer_id': target_customer_id})
@@ -738,81 +855,151 @@ def merge_customers(customer_id):
         db.session.delete(source_customer)
         db.session.commit()
         
-        return jsonify({
+        return ojsonify({
             'success': True,
             'data': target_customer.to_dict(),
             'message': f'Successfully merged customer {source_customer.name} into {target_customer.name}'
         })
     except Exception as e:
         db.session.rollback()
-        return jsonify({'success': False, 'error': str(e)}), 500
+        return ojsonify({'success': False, 'error': str(e)}), 500
+
+def _shared_key_members(dup_type, key_column, *criteria):
+    """Select (type, key, id) for customers whose key is shared with another customer"""
+    shared_keys = select(key_column).where(*criteria).group_by(key_column).having(func.count(Customer.id) > 1)
+    # Repeating the criteria on the outer select lets a partial index (the
+    # phone one) serve it; SQLite indexes carry the rowid, so (key, id) is
+    # read from the index alone without touching the table
+    return select(
+        literal(dup_type).label('type'), key_column.label('key'), Customer.id.label('id')
+    ).where(*criteria, key_column.in_(shared_keys))
+
+def _refresh_duplicate_candidates(version):
+    """Recompute duplicate customer groups into duplicate_candidates"""
+    # The email, phone and name scans are combined into one UNION ALL so the
+    # three aggregations are a single statement. Similar names (basic
+    # similarity) share a first word longer than 2 characters.
+    members = union_all(
+        _shared_key_members('email', Customer.email, Customer.email.isnot(None), Customer.email != ''),
+        _shared_key_members('phone', Customer.phone, CUSTOMER_HAS_PHONE),
+        _shared_key_members('name', CUSTOMER_NAME_PREFIX, func.length(CUSTOMER_NAME_PREFIX) > 2)
+    ).subquery()
+    
+    # Reading in id order keeps each group's ids sorted and name groups in
+    # order of their earliest customer; email and phone groups go by key
+    by_type = {'email': defaultdict(list), 'phone': defaultdict(list), 'name': defaultdict(list)}
+    for dup_type, key, customer_id in db.session.execute(select(members).order_by(members.c.id)):
+        by_type[dup_type][key].append(customer_id)
+    email_groups = dict(sorted(by_type['email'].items()))
+    phone_groups = dict(sorted(by_type['phone'].items()))
+    name_groups = by_type['name']
+    
+    DuplicateCandidate.query.delete()
+    bulk_insert(DuplicateCandidate, [
+        {'type': dup_type, 'key': key, 'customer_ids': customer_ids}
+        for dup_type, groups in (('email', email_groups), ('phone', phone_groups), ('name', name_groups))
+        for key, customer_ids in groups.items()
+    ])
+    # Record which customer_keys_version the stored groups were computed for
+    if version is not None:
+        db.session.merge(Counter(name='duplicates_version', value=version))
+    db.session.commit()
+    
+    return {
+        'email_duplicate_groups': len(email_groups),
+        'phone_duplicate_groups': len(phone_groups),
+        'name_duplicate_groups': len(name_groups)
+    }
+
+@customers_bp.route('/customers/duplicates/refresh', methods=['POST'])
+def refresh_duplicate_customers():
+    """Recompute the stored duplicate customer groups"""
+    try:
+        keys_version = db.session.query(Counter.value).filter_by(name='customer_keys_version').scalar()
+        summary = _refresh_duplicate_candidates(keys_version)
+        cache.delete_prefix('customer-duplicates:')
+        
+        return ojsonify({
+            'success': True,
+            'summary': summary,
+            'message': 'Duplicate customer groups refreshed'
+        })
+    except Exception as e:
+        db.session.rollback()
+        return ojsonify({'success': False, 'error': str(e)}), 500
 
 @customers_bp.route('/customers/duplicates', methods=['GET'])
 def find_duplicate_customers():
     """Find potential duplicate customers based on name, email, or phone"""
     try:
-        # Find customers with same email
-        email_duplicates = db.session.query(
-            Customer.email,
-            func.count(Customer.id).label('count'),
-            func.group_concat(Customer.id).label('customer_ids')
-        ).filter(
-            Customer.email.isnot(None),
-            Customer.email != ''
-        ).group_by(Customer.email).having(func.count(Customer.id) > 1).all()
-        
-        # Find customers with same phone
-        phone_duplicates = db.session.query(
-            Customer.phone,
-            func.count(Customer.id).label('count'),
-            func.group_concat(Customer.id).label('customer_ids')
-        ).filter(
-            Customer.phone.isnot(None),
-            Customer.phone != ''
-        ).group_by(Customer.phone).having(func.count(Customer.id) > 1).all()
-        
-        # Find customers with similar names (basic similarity)
-        name_groups = defaultdict(list)
-        customers = Customer.query.all()
-        for customer in customers:
-            # Simple name similarity - group by first word of name
-            first_word = customer.name.split()[0].lower() if customer.name else ''
-            if len(first_word) > 2:  # Only consider names longer than 2 characters
-                name_groups[first_word].append(customer)
-        
+        # Triggers bump customers_version on any customer or total change, so a
+        # cached result for the current version is still accurate
+        version = db.session.query(Counter.value).filter_by(name='customers_version').scalar()
+        cache_key = f'customer-duplicates:v1:{version}'
+        if version is not None:
+            cached = cache.get(cache_key)
+            if cached is not None:
+                return ojsonify(cached)
+        
+        # Groups are read from duplicate_candidates; they are only recomputed
+        # when a customer's name, email or phone changed since the last
+        # refresh. Sales only move customers_version, which re-renders the
+        # name group totals below without rescanning.
+        keys_version = db.session.query(Counter.value).filter_by(name='customer_keys_version').scalar()
+        stored_version = db.session.query(Counter.value).filter_by(name='duplicates_version').scalar()
+        if keys_version is None or stored_version != keys_version:
+            _refresh_duplicate_candidates(keys_version)
+        
+        candidates = defaultdict(list)
+        for candidate in DuplicateCandidate.query.order_by(DuplicateCandidate.id):
+            candidates[candidate.type].append(candidate)
+        
+        # Only the name groups that are returned need their customers loaded
+        shown_names = candidates['name'][:10]
+        duplicate_ids = [customer_id for group in shown_names for customer_id in group.customer_ids]
+        customers = {c.id: c for c in Customer.query.filter(Customer.id.in_(duplicate_ids))} if duplicate_ids else {}
+        totals = compute_customer_totals(duplicate_ids)
         name_duplicates = [
             {
-                'similar_name': key,
-                'customers': [c.to_dict() for c in customers_list]
+                'similar_name': group.key,
+                'customers': [
+                    customers[customer_id].to_dict(total_purchases=totals.get(customer_id, 0))
+                    for customer_id in group.customer_ids if customer_id in customers
+                ]
             }
-            for key, customers_list in name_groups.items() 
-            if len(customers_list) > 1
+            for group in shown_names
         ]
         
-        return jsonify({
+        payload = {
             'success': True,
             'data': {
                 'email_duplicates': [
                     {
-                        'email': dup.email,
-                        'count': dup.count,
-                        'customer_ids': [int(id) for id in dup.customer_ids.split(',')]
-                    } for dup in email_duplicates
+                        'email': group.key,
+                        'count': len(group.customer_ids),
+                        'customer_ids': group.customer_ids
+                    } for group in candidates['email']
                 ],
                 'phone_duplicates': [
                     {
-                        'phone': dup.phone,
-                        'count': dup.count,
-                        'customer_ids': [int(id) for id in dup.customer_ids.split(',')]
-                    } for dup in phone_duplicates
+                        'phone': group.key,
+                        'count': len(group.customer_ids),
+                        'customer_ids': group.customer_ids
+                    } for group in candidates['phone']
                 ],
-                'name_duplicates': name_duplicates[:10]  # Limit to 10 groups
+                'name_duplicates': name_duplicates  # Limited to 10 groups
             },
             'summary': {
-                'email_duplicate_groups': len(email_duplicates),
-                'phone_duplicate_groups': len(phone_duplicates),
-                'name_duplicate_groups': len([g for g in name_groups.values() if len(g) > 1])
+                'email_duplicate_groups': len(candidates['email']),
+                'phone_duplicate_groups': len(candidates['phone']),
+                'name_duplicate_groups': len(candidates['name'])
             }
-        })
+        }
+        if version is not None:
+            cache.delete_prefix('customer-duplicates:')
+            cache.set(cache_key, payload, DUPLICATES_CACHE_TTL)
+        
+        return ojsonify(payload)
     except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
+        db.session.rollback()
+        return ojsonify({'success': False, 'error': str(e)}), 500
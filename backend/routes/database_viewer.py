@@ -1,37 +1,79 @@
-from flask import Blueprint, jsonify
+from flask import Blueprint, Response, stream_with_context
 from database import db
 from sqlalchemy import inspect, text
+from utils.helpers import accepts_gzip, gzip_stream, ojsonify
+import orjson
 
 database_viewer_bp = Blueprint('database_viewer', __name__)
 
+# Rows fetched from the cursor and written per step
+ROW_BATCH_SIZE = 200
+
+# Rows shown per table
+TABLE_ROW_LIMIT = 500
+
+# Internal tables FTS5 keeps alongside each full-text index
+FTS_SHADOW_SUFFIXES = ('_data', '_idx', '_docsize', '_config', '_content')
+
+# {schema_version: table names}; SQLite bumps schema_version on any DDL
+_table_names_cache = {}
+
+def _get_table_names():
+    """Return user table names, re-inspecting only after a schema change"""
+    schema_version = db.session.execute(text('PRAGMA schema_version')).scalar()
+    table_names = _table_names_cache.get(schema_version)
+    if table_names is None:
+        # The SQLite inspector already leaves out internal sqlite_* tables
+        all_names = inspect(db.engine).get_table_names()
+        shadow_tables = {
+            f'{name}{suffix}'
+            for (name,) in db.session.execute(
+                text("SELECT name FROM sqlite_master WHERE sql LIKE 'CREATE VIRTUAL TABLE%USING fts5%'")
+            )
+            for suffix in FTS_SHADOW_SUFFIXES
+        }
+        # Skip FTS5 shadow tables
+        table_names = [name for name in all_names if name not in shadow_tables]
+        _table_names_cache.clear()
+        _table_names_cache[schema_version] = table_names
+    return table_names
+
 @database_viewer_bp.route('/database/tables', methods=['GET'])
 def get_all_tables_data():
     """
     Dynamically fetches all columns and rows from every table in the database.
     """
     try:
-        inspector = inspect(db.engine)
-        table_names = inspector.get_table_names()
-        
-        all_tables_data = {}
-        
-        for table_name in table_names:
-            # Skip internal sqlite tables
-            if table_name.startswith('sqlite_'):
-                continue
-            
-            # Using raw SQL for simplicity and to avoid model dependency
-            query = text(f"SELECT * FROM {table_name} LIMIT 500") # Limit to 500 rows per table for performance
-            result_proxy = db.session.execute(query)
-            
-            columns = list(result_proxy.keys())
-            rows = [dict(row) for row in result_proxy.mappings()]
-            
-            all_tables_data[table_name] = {
-                'columns': columns,
-                'rows': rows
-            }
-            
-        return jsonify({'success': True, 'data': all_tables_data})
+        table_names = _get_table_names()
+        quote = db.engine.dialect.identifier_preparer.quote
+
+        def generate():
+            """Stream each table's rows in batches instead of building one big dict"""
+            # One Core connection for every table; yield_per turns on
+            # stream_results so drivers with server-side cursors fetch in batches
+            connection = db.session.connection().execution_options(yield_per=ROW_BATCH_SIZE)
+            yield b'{"success":true,"data":{'
+            for i, table_name in enumerate(table_names):
+                # Using raw SQL for simplicity and to avoid model dependency
+                query = text(f"SELECT * FROM {quote(table_name)} LIMIT :limit")
+                result_proxy = connection.execute(query, {'limit': TABLE_ROW_LIMIT})
+
+                columns = list(result_proxy.keys())
+                yield (b',' if i else b'') + orjson.dumps(table_name) + b':{"columns":' + orjson.dumps(columns) + b',"rows":['
+                # Rows are positional arrays matching `columns`, so column names
+                # are not repeated for every row
+                for n, rows in enumerate(result_proxy.partitions()):
+                    # default=str covers values orjson has no native encoding for (e.g. BLOBs)
+                    yield (b',' if n else b'') + orjson.dumps([tuple(row) for row in rows], default=str)[1:-1]
+                yield b']}'
+            yield b'}}'
+
+        # Tabular JSON compresses well, so gzip it on the fly when the client allows
+        headers = {'Vary': 'Accept-Encoding'}
+        body = generate()
+        if accepts_gzip():
+            body = gzip_stream(body)
+            headers['Content-Encoding'] = 'gzip'
+        return Response(stream_with_context(body), mimetype='application/json', headers=headers)
     except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
\ No newline at end of file
+        return ojsonify({'success': False, 'error': str(e)}), 500
@@ -1,12 +1,53 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, current_app, request, jsonify, stream_with_context
 from database import db
-from models import Product, Purchase, PurchaseItem, Sale, SaleItem
+from models import Product, Category, Counter, Purchase, PurchaseItem, Sale, SaleItem, compute_batch_stock_map
 from datetime import datetime, timedelta
-from sqlalchemy import func, and_, or_
+from functools import wraps
+from sqlalchemy import func, and_, or_, case, literal, select, union_all, update
+from sqlalchemy.orm import joinedload, selectinload
+from utils.cache import cache
+from utils.helpers import InvalidCursor, keyset_paginate
+import orjson
+import sqlite3
 import uuid
 
 inventory_bp = Blueprint('inventory', __name__)
 
+ANALYTICS_CACHE_TTL = 300  # seconds; entries are also keyed on inventory_version
+ALERT_CHUNK_SIZE = 500
+ALERT_BUCKETS = ('critical', 'warning', 'overstocked')
+REORDER_PRIORITIES = ('high', 'medium', 'low')  # indexed by the SQL priority rank
+# UPDATE ... RETURNING needs SQLite 3.35+
+UPDATE_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+
+_analytics_cache_version = None  # inventory_version of the entries currently cached
+
+def cached_analytics(view):
+    """Serve a successful analytics response from cache until inventory data changes"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        # Triggers bump inventory_version on any product or sale write, so a
+        # cached body for the current version is still accurate
+        version = db.session.query(Counter.value).filter_by(name='inventory_version').scalar()
+        if version is None:
+            return view(*args, **kwargs)
+        
+        cache_key = f'inventory-analytics:v1:{version}:{request.path}:{sorted(request.args.items(multi=True))}'
+        body = cache.get(cache_key)
+        if body is not None:
+            return current_app.response_class(body, mimetype='application/json')
+        
+        response = view(*args, **kwargs)
+        if not isinstance(response, tuple) and response.status_code == 200:
+            global _analytics_cache_version
+            if version != _analytics_cache_version:
+                # Entries for older versions can never be served again
+                cache.delete_prefix('inventory-analytics:v1:')
+                _analytics_cache_version = version
+            cache.set(cache_key, response.get_data(), ANALYTICS_CACHE_TTL)
+        return response
+    return wrapper
+
 @inventory_bp.route('/inventory', methods=['GET'])
 def get_inventory():
     """Get all inventory items with stock levels"""
@@ -16,8 +57,12 @@ def get_inventory():
         search = request.args.get('search', '')
         category_id = request.args.get('category_id', type=int)
         stock_status = request.args.get('stock_status', '')  # 'low', 'out', 'normal'
+        # Passing cursor (empty for the first page) switches to keyset paging
+        # on (name, id); next_cursor carries the last row's name and id, so
+        # deactivating that product between pages does not break the walk
+        cursor = request.args.get('cursor')
         
-        query = Product.query.filter_by(is_active=True)
+        query = Product.query.options(joinedload(Product.category).load_only(Category.id, Category.name), selectinload(Product.batches)).filter_by(is_active=True)
         
         # Search filter
         if search:
@@ -46,40 +91,44 @@ def get_inventory():
         elif stock_status == 'normal':
             query = query.filter(Product.stock_quantity > Product.min_stock_level)
         
-        products = query.order_by(Product.name).paginate(
-            page=page, per_page=per_page, error_out=False
-        )
+        if cursor is not None:
+            try:
+                items, next_cursor = keyset_paginate(query, Product.name, Product.id, cursor, per_page)
+            except InvalidCursor as e:
+                return jsonify({'success': False, 'error': str(e)}), 400
+            pagination = {'per_page': per_page, 'next_cursor': next_cursor}
+        else:
+            products = query.order_by(Product.name).paginate(
+                page=page, per_page=per_page, error_out=False
+            )
+            items = products.items
+            pagination = {
+                'page': page,
+                'pages': products.pages,
+                'per_page': per_page,
+                'total': products.total
+            }
         
-        # Calculate inventory summary
-        total_products = Product.query.filter_by(is_active=True).count()
-        low_stock_count = Product.query.filter(
-            Product.stock_quantity <= Product.min_stock_level,
-            Product.stock_quantity > 0,
-            Product.is_active == True
-        ).count()
-        out_of_stock_count = Product.query.filter(
-            Product.stock_quantity == 0,
-            Product.is_active == True
-        ).count()
-        total_stock_value = db.session.query(
+        # Calculate inventory summary with conditional aggregates in one scan
+        total_products, low_stock_count, out_of_stock_count, total_stock_value = db.session.query(
+            func.count(Product.id),
+            func.count(case((and_(Product.stock_quantity <= Product.min_stock_level, Product.stock_quantity > 0), Product.id))),
+            func.count(case((Product.stock_quantity == 0, Product.id))),
             func.sum(Product.stock_quantity * Product.cost_price)
-        ).filter(Product.is_active == True).scalar() or 0
+        ).filter(Product.is_active == True).one()
+        total_stock_value = total_stock_value or 0
+        stock_map = compute_batch_stock_map([p.id for p in items if p.batch_management_enabled])
         
         return jsonify({
             'success': True,
-            'data': [product.to_dict() for product in products.items],
+            'data': [product.to_dict(stock_map=stock_map) for product in items],
             'summary': {
                 'total_products': total_products,
                 'low_stock_count': low_stock_count,
                 'out_of_stock_count': out_of_stock_count,
                 'total_stock_value': total_stock_value
             },
-            'pagination': {
-                'page': page,
-                'pages': products.pages,
-                'per_page': per_page,
-                'total': products.total
-            }
+            'pagination': pagination
         })
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -88,15 +137,16 @@ def get_inventory():
 def get_low_stock():
     """Get products with low stock levels"""
     try:
-        products = Product.query.filter(
+        products = Product.query.options(joinedload(Product.category).load_only(Category.id, Category.name), selectinload(Product.batches)).filter(
             Product.stock_quantity <= Product.min_stock_level,
             Product.stock_quantity > 0,
             Product.is_active == True
         ).order_by(Product.stock_quantity.asc()).all()
+        stock_map = compute_batch_stock_map([p.id for p in products if p.batch_management_enabled])
         
         return jsonify({
             'success': True,
-            'data': [product.to_dict() for product in products],
+            'data': [product.to_dict(stock_map=stock_map) for product in products],
             'count': len(products)
         })
     except Exception as e:
@@ -106,14 +156,15 @@ def get_low_stock():
 def get_out_of_stock():
     """Get products that are out of stock"""
     try:
-        products = Product.query.filter(
+        products = Product.query.options(joinedload(Product.category).load_only(Category.id, Category.name), selectinload(Product.batches)).filter(
             Product.stock_quantity == 0,
             Product.is_active == True
         ).order_by(Product.name).all()
+        stock_map = compute_batch_stock_map([p.id for p in products if p.batch_management_enabled])
         
         return jsonify({
             'success': True,
-            'data': [product.to_dict() for product in products],
+            'data': [product.to_dict(stock_map=stock_map) for product in products],
             'count': len(products)
         })
     except Exception as e:
@@ -134,7 +185,6 @@ def create_inventory_adjustment():
                     'error': f'{field} is required'
                 }), 400
         
-        product = Product.query.get_or_404(data['product_id'])
         adjustment_type = data['type']  # 'increase' or 'decrease'
         quantity = int(data['quantity'])
         reason = data.get('reason', '')
@@ -145,25 +195,44 @@ def create_inventory_adjustment():
                 'error': 'Quantity must be greater than 0'
             }), 400
         
-        old_quantity = product.stock_quantity
-        
         if adjustment_type == 'increase':
-            product.stock_quantity += quantity
+            delta = quantity
         elif adjustment_type == 'decrease':
-            if product.stock_quantity < quantity:
-                return jsonify({
-                    'success': False,
-                    'error': f'Cannot decrease stock below zero. Current stock: {product.stock_quantity}'
-                }), 400
-            product.stock_quantity -= quantity
+            delta = -quantity
         else:
             return jsonify({
                 'success': False,
                 'error': 'Invalid adjustment type. Use "increase" or "decrease"'
             }), 400
         
-        product.updated_at = datetime.utcnow()
+        # Apply the change in one guarded UPDATE so concurrent adjustments
+        # cannot overwrite each other or take stock below zero
+        adjust = update(Product).where(
+            Product.id == data['product_id'],
+            Product.stock_quantity + delta >= 0
+        ).values(
+            stock_quantity=Product.stock_quantity + delta,
+            updated_at=datetime.utcnow()
+        )
+        if UPDATE_RETURNING:
+            new_quantity = db.session.execute(adjust.returning(Product.stock_quantity)).scalar()
+        elif db.session.execute(adjust).rowcount:
+            # The transaction holds the write lock until commit, so the
+            # re-read sees exactly this adjustment
+            new_quantity = db.session.query(Product.stock_quantity).filter_by(id=data['product_id']).scalar()
+        else:
+            new_quantity = None
+        
+        if new_quantity is None:
+            product = Product.query.get_or_404(data['product_id'])
+            return jsonify({
+                'success': False,
+                'error': f'Cannot decrease stock below zero. Current stock: {product.stock_quantity}'
+            }), 400
+        
         db.session.commit()
+        product = Product.query.get(data['product_id'])
+        old_quantity = new_quantity - delta
         
         return jsonify({
             'success': True,
@@ -173,7 +242,7 @@ def create_inventory_adjustment():
                     'type': adjustment_type,
                     'quantity': quantity,
                     'old_quantity': old_quantity,
-                    'new_quantity': product.stock_quantity,
+                    'new_quantity': new_quantity,
                     'reason': reason
                 }
             },
@@ -199,16 +268,33 @@ def bulk_update_inventory():
         updated_products = []
         errors = []
         
-        for update in updates:
+        # Load every referenced product in one query instead of one get() per update
+        product_ids = {
+            int(u['product_id']) for u in updates
+            if isinstance(u, dict) and str(u.get('product_id', '')).isdigit()
+        }
+        products = {
+            product.id: product
+            for product in Product.query.options(
+                joinedload(Product.category).load_only(Category.id, Category.name),
+                selectinload(Product.batches)
+            ).filter(Product.id.in_(product_ids))
+        } if product_ids else {}
+        updated_at = datetime.utcnow()
+        
+        for item in updates:
+            if not isinstance(item, dict):
+                errors.append(f'Invalid update entry: {item}')
+                continue
             try:
-                product_id = update.get('product_id')
-                new_quantity = update.get('quantity')
+                product_id = item.get('product_id')
+                new_quantity = item.get('quantity')
                 
                 if not product_id or new_quantity is None:
-                    errors.append(f'Missing product_id or quantity in update: {update}')
+                    errors.append(f'Missing product_id or quantity in update: {item}')
                     continue
                 
-                product = Product.query.get(product_id)
+                product = products.get(int(product_id)) if str(product_id).isdigit() else None
                 if not product:
                     errors.append(f'Product with ID {product_id} not found')
                     continue
@@ -217,9 +303,11 @@ def bulk_update_inventory():
                     errors.append(f'Quantity cannot be negative for product {product.name}')
                     continue
                 
+                # Every product gets the same two columns, so the flush sends
+                # all of them as one executemany UPDATE
                 product.stock_quantity = int(new_quantity)
-                product.updated_at = datetime.utcnow()
-                updated_products.append(product.to_dict())
+                product.updated_at = updated_at
+                updated_products.append(product)
                 
             except Exception as e:
                 errors.append(f'Error updating product {product_id}: {str(e)}')
@@ -231,6 +319,8 @@ def bulk_update_inventory():
                 'errors': errors
             }), 400
         
+        stock_map = compute_batch_stock_map([p.id for p in updated_products if p.batch_management_enabled])
+        updated_products = [product.to_dict(stock_map=stock_map) for product in updated_products]
         db.session.commit()
         
         return jsonify({
@@ -243,36 +333,35 @@ def bulk_update_inventory():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @inventory_bp.route('/inventory/valuation', methods=['GET'])
+@cached_analytics
 def get_inventory_valuation():
     """Get inventory valuation report"""
     try:
-        products = Product.query.filter_by(is_active=True).all()
+        # Value per category is summed in SQL; only one row per category
+        # comes back instead of every active product
+        category_name = func.coalesce(Category.name, 'Uncategorized')
+        category_rows = db.session.query(
+            category_name.label('category_name'),
+            func.sum(Product.stock_quantity * Product.cost_price).label('cost_value'),
+            func.sum(Product.stock_quantity * Product.price).label('retail_value'),
+            func.count(Product.id).label('product_count'),
+            func.sum(Product.stock_quantity).label('total_units')
+        ).outerjoin(Category, Product.category_id == Category.id).filter(
+            Product.is_active == True
+        ).group_by(category_name).all()
+        
+        category_breakdown = {
+            row.category_name: {
+                'cost_value': row.cost_value or 0,
+                'retail_value': row.retail_value or 0,
+                'product_count': row.product_count,
+                'total_units': row.total_units or 0
+            }
+            for row in category_rows
+        }
         
-        total_cost_value = 0
-        total_retail_value = 0
-        category_breakdown = {}
-        
-        for product in products:
-            cost_value = product.stock_quantity * product.cost_price
-            retail_value = product.stock_quantity * product.price
-            
-            total_cost_value += cost_value
-            total_retail_value += retail_value
-            
-            # Category breakdown
-            category_name = product.category.name if product.category else 'Uncategorized'
-            if category_name not in category_breakdown:
-                category_breakdown[category_name] = {
-                    'cost_value': 0,
-                    'retail_value': 0,
-                    'product_count': 0,
-                    'total_units': 0
-                }
-            
-            category_breakdown[category_name]['cost_value'] += cost_value
-            category_breakdown[category_name]['retail_value'] += retail_value
-            category_breakdown[category_name]['product_count'] += 1
-            category_breakdown[category_name]['total_units'] += product.stock_quantity
+        total_cost_value = sum(c['cost_value'] for c in category_breakdown.values())
+        total_retail_value = sum(c['retail_value'] for c in category_breakdown.values())
         
         potential_profit = total_retail_value - total_cost_value
         profit_margin = (potential_profit / total_retail_value * 100) if total_retail_value > 0 else 0
@@ -285,8 +374,8 @@ def get_inventory_valuation():
                 'potential_profit': potential_profit,
                 'profit_margin': profit_margin,
                 'category_breakdown': category_breakdown,
-                'total_products': len(products),
-                'total_units': sum(p.stock_quantity for p in products)
+                'total_products': sum(c['product_count'] for c in category_breakdown.values()),
+                'total_units': sum(c['total_units'] for c in category_breakdown.values())
             }
         })
     except Exception as e:
@@ -301,79 +390,76 @@ def get_inventory_movement():
         
         start_date = datetime.utcnow() - timedelta(days=days)
         
-        # Base queries
-        sales_query = db.session.query(
-            SaleItem.product_id,
-            Product.name.label('product_name'),
-            func.sum(SaleItem.quantity).label('sold_quantity'),
-            func.sum(SaleItem.total_price).label('sales_value')
-        ).join(Product).join(Sale).filter(
+        # Sales and completed purchases as one UNION ALL of per-item rows, each
+        # filling only its own columns, pivoted per product by the outer GROUP BY
+        sales_rows = select(
+            SaleItem.product_id.label('product_id'),
+            SaleItem.quantity.label('sold_quantity'),
+            SaleItem.total_price.label('sales_value'),
+            literal(0).label('purchased_quantity'),
+            literal(0).label('purchase_value')
+        ).join(Sale, SaleItem.sale_id == Sale.id).where(
             Sale.created_at >= start_date
         )
         
-        purchases_query = db.session.query(
+        purchase_rows = select(
             PurchaseItem.product_id,
-            Product.name.label('product_name'),
-            func.sum(PurchaseItem.quantity).label('purchased_quantity'),
-            func.sum(PurchaseItem.total_cost).label('purchase_value')
-        ).join(Product).join(Purchase).filter(
+            literal(0),
+            literal(0),
+            PurchaseItem.quantity,
+            PurchaseItem.total_cost
+        ).join(Purchase, PurchaseItem.purchase_id == Purchase.id).where(
             Purchase.created_at >= start_date,
             Purchase.status == 'completed'
         )
         
         # Filter by product if specified
         if product_id:
-            sales_query = sales_query.filter(SaleItem.product_id == product_id)
-            purchases_query = purchases_query.filter(PurchaseItem.product_id == product_id)
+            sales_rows = sales_rows.where(SaleItem.product_id == product_id)
+            purchase_rows = purchase_rows.where(PurchaseItem.product_id == product_id)
         
-        # Group by product
-        sales_data = sales_query.group_by(SaleItem.product_id, Product.name).all()
-        purchases_data = purchases_query.group_by(PurchaseItem.product_id, Product.name).all()
-        
-        # Combine data
-        movement_data = {}
-        
-        # Add sales data
-        for sale in sales_data:
-            movement_data[sale.product_id] = {
-                'product_id': sale.product_id,
-                'product_name': sale.product_name,
-                'sold_quantity': sale.sold_quantity or 0,
-                'sales_value': sale.sales_value or 0,
-                'purchased_quantity': 0,
-                'purchase_value': 0
-            }
+        movements = union_all(sales_rows, purchase_rows).subquery()
         
-        # Add purchase data
-        for purchase in purchases_data:
-            if purchase.product_id in movement_data:
-                movement_data[purchase.product_id]['purchased_quantity'] = purchase.purchased_quantity or 0
-                movement_data[purchase.product_id]['purchase_value'] = purchase.purchase_value or 0
-            else:
-                movement_data[purchase.product_id] = {
-                    'product_id': purchase.product_id,
-                    'product_name': purchase.product_name,
-                    'sold_quantity': 0,
-                    'sales_value': 0,
-                    'purchased_quantity': purchase.purchased_quantity or 0,
-                    'purchase_value': purchase.purchase_value or 0
-                }
+        # Group by product
+        movement_rows = db.session.query(
+            movements.c.product_id,
+            Product.name.label('product_name'),
+            func.sum(movements.c.sold_quantity).label('sold_quantity'),
+            func.sum(movements.c.sales_value).label('sales_value'),
+            func.sum(movements.c.purchased_quantity).label('purchased_quantity'),
+            func.sum(movements.c.purchase_value).label('purchase_value')
+        ).join(Product, Product.id == movements.c.product_id).group_by(
+            movements.c.product_id, Product.name
+        ).all()
         
-        # Calculate net movement
-        for product_data in movement_data.values():
-            product_data['net_movement'] = product_data['purchased_quantity'] - product_data['sold_quantity']
-            product_data['net_value'] = product_data['purchase_value'] - product_data['sales_value']
+        movement_data = []
+        for row in movement_rows:
+            sold_quantity = row.sold_quantity or 0
+            sales_value = row.sales_value or 0
+            purchased_quantity = row.purchased_quantity or 0
+            purchase_value = row.purchase_value or 0
+            movement_data.append({
+                'product_id': row.product_id,
+                'product_name': row.product_name,
+                'sold_quantity': sold_quantity,
+                'sales_value': sales_value,
+                'purchased_quantity': purchased_quantity,
+                'purchase_value': purchase_value,
+                # Net movement
+                'net_movement': purchased_quantity - sold_quantity,
+                'net_value': purchase_value - sales_value
+            })
         
         return jsonify({
             'success': True,
-            'data': list(movement_data.values()),
+            'data': movement_data,
             'period': f'Last {days} days',
             'summary': {
                 'total_products_moved': len(movement_data),
-                'total_sold': sum(p['sold_quantity'] for p in movement_data.values()),
-                'total_purchased': sum(p['purchased_quantity'] for p in movement_data.values()),
-                'total_sales_value': sum(p['sales_value'] for p in movement_data.values()),
-                'total_purchase_value': sum(p['purchase_value'] for p in movement_data.values())
+                'total_sold': sum(p['sold_quantity'] for p in movement_data),
+                'total_purchased': sum(p['purchased_quantity'] for p in movement_data),
+                'total_sales_value': sum(p['sales_value'] for p in movement_data),
+                'total_purchase_value': sum(p['purchase_value'] for p in movement_data)
             }
         })
     except Exception as e:
@@ -385,26 +471,54 @@ def get_reorder_suggestions():
     try:
         days = request.args.get('days', 30, type=int)
         
-        # Get products with low stock
-        low_stock_products = Product.query.filter(
+        start_date = datetime.utcnow() - timedelta(days=days)
+        
+        low_stock = (
             Product.stock_quantity <= Product.min_stock_level,
             Product.is_active == True
-        ).all()
+        )
+        
+        # Units sold per low-stock product in the period, grouped once and
+        # outer-joined so products without sales count as 0
+        sold = db.session.query(
+            SaleItem.product_id,
+            func.sum(SaleItem.quantity).label('total_sold')
+        ).join(Sale).join(Product, SaleItem.product_id == Product.id).filter(
+            Sale.created_at >= start_date,
+            *low_stock
+        ).group_by(SaleItem.product_id).subquery()
+        sold_in_period = func.coalesce(sold.c.total_sold, 0)
+        
+        # Priority in SQL: days of stock (stock / (sold / days)) under 7 is
+        # high and under 14 medium, compared without dividing; no sales means
+        # unlimited days of stock, so low
+        if days > 0:
+            priority_rank = case(
+                (and_(sold_in_period > 0, Product.stock_quantity * days < 7 * sold_in_period), 0),
+                (and_(sold_in_period > 0, Product.stock_quantity * days < 14 * sold_in_period), 1),
+                else_=2
+            )
+        else:
+            priority_rank = literal(2)
+        
+        # Get products with low stock, high priority first
+        low_stock_rows = db.session.query(Product, sold_in_period, priority_rank).options(
+            joinedload(Product.category).load_only(Category.id, Category.name),
+            selectinload(Product.batches)
+        ).outerjoin(sold, sold.c.product_id == Product.id).filter(
+            *low_stock
+        ).order_by(priority_rank, Product.id).all()
+        stock_map = compute_batch_stock_map([p.id for p, _, _ in low_stock_rows if p.batch_management_enabled])
         
         suggestions = []
-        start_date = datetime.utcnow() - timedelta(days=days)
+        priority_counts = dict.fromkeys(REORDER_PRIORITIES, 0)
         
-        for product in low_stock_products:
+        for product, total_sold, rank in low_stock_rows:
             # Calculate sales velocity
-            total_sold = db.session.query(
-                func.sum(SaleItem.quantity)
-            ).join(Sale).filter(
-                SaleItem.product_id == product.id,
-                Sale.created_at >= start_date
-            ).scalar() or 0
-            
             daily_velocity = total_sold / days if days > 0 else 0
-            days_of_stock = product.stock_quantity / daily_velocity if daily_velocity > 0 else float('inf')
+            days_of_stock = product.stock_quantity / daily_velocity if daily_velocity > 0 else None
+            priority = REORDER_PRIORITIES[rank]
+            priority_counts[priority] += 1
             
             # Suggest reorder quantity (30 days worth + safety stock)
             suggested_quantity = max(
@@ -413,31 +527,27 @@ def get_reorder_suggestions():
             )
             
             suggestions.append({
-                'product': product.to_dict(),
+                'product': product.to_dict(stock_map=stock_map),
                 'sales_velocity': {
                     'total_sold_period': total_sold,
                     'daily_average': daily_velocity,
-                    'days_of_stock_remaining': days_of_stock if days_of_stock != float('inf') else None
+                    'days_of_stock_remaining': days_of_stock
                 },
                 'suggestion': {
                     'reorder_quantity': suggested_quantity,
                     'estimated_cost': suggested_quantity * product.cost_price,
-                    'priority': 'high' if days_of_stock < 7 else 'medium' if days_of_stock < 14 else 'low'
+                    'priority': priority
                 }
             })
         
-        # Sort by priority (high first)
-        priority_order = {'high': 0, 'medium': 1, 'low': 2}
-        suggestions.sort(key=lambda x: priority_order.get(x['suggestion']['priority'], 3))
-        
         return jsonify({
             'success': True,
             'data': suggestions,
             'summary': {
                 'total_suggestions': len(suggestions),
-                'high_priority': len([s for s in suggestions if s['suggestion']['priority'] == 'high']),
-                'medium_priority': len([s for s in suggestions if s['suggestion']['priority'] == 'medium']),
-                'low_priority': len([s for s in suggestions if s['suggestion']['priority'] == 'low']),
+                'high_priority': priority_counts['high'],
+                'medium_priority': priority_counts['medium'],
+                'low_priority': priority_counts['low'],
                 'total_estimated_cost': sum(s['suggestion']['estimated_cost'] for s in suggestions)
             }
         })
@@ -445,13 +555,17 @@ def get_reorder_suggestions():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @inventory_bp.route('/inventory/abc-analysis', methods=['GET'])
+@cached_analytics
 def get_abc_analysis():
     """Get ABC analysis of inventory (based on sales value)"""
     try:
         days = request.args.get('days', 90, type=int)
         start_date = datetime.utcnow() - timedelta(days=days)
         
-        # Get sales data for each product
+        # Get sales data for each product, highest revenue first, with the
+        # running and overall revenue computed by window functions
+        revenue = func.sum(SaleItem.total_price)
+        revenue_order = (revenue.desc(), Product.id)
         product_sales = db.session.query(
             Product.id,
             Product.name,
@@ -460,11 +574,13 @@ def get_abc_analysis():
             Product.price,
             Product.cost_price,
             func.sum(SaleItem.quantity).label('total_sold'),
-            func.sum(SaleItem.total_price).label('total_revenue')
+            revenue.label('total_revenue'),
+            func.sum(revenue).over(order_by=revenue_order, rows=(None, 0)).label('cumulative_revenue'),
+            func.sum(revenue).over().label('overall_revenue')
         ).join(SaleItem).join(Sale).filter(
             Sale.created_at >= start_date,
             Product.is_active == True
-        ).group_by(Product.id).all()
+        ).group_by(Product.id).order_by(*revenue_order).all()
         
         if not product_sales:
             return jsonify({
@@ -473,18 +589,13 @@ def get_abc_analysis():
                 'message': 'No sales data found for the specified period'
             })
         
-        # Sort by revenue (descending)
-        sorted_products = sorted(product_sales, key=lambda x: x.total_revenue, reverse=True)
+        total_revenue = product_sales[0].overall_revenue
         
-        total_revenue = sum(p.total_revenue for p in sorted_products)
-        
-        # Calculate cumulative percentages and classify
-        cumulative_revenue = 0
+        # Classify by cumulative percentage
         classified_products = {'A': [], 'B': [], 'C': []}
         
-        for product in sorted_products:
-            cumulative_revenue += product.total_revenue
-            cumulative_percentage = (cumulative_revenue / total_revenue) * 100
+        for product in product_sales:
+            cumulative_percentage = (product.cumulative_revenue / total_revenue) * 100
             
             product_data = {
                 'id': product.id,
@@ -511,7 +622,7 @@ def get_abc_analysis():
             'success': True,
             'data': classified_products,
             'summary': {
-                'total_products': len(sorted_products),
+                'total_products': len(product_sales),
                 'total_revenue': total_revenue,
                 'category_counts': {
                     'A': len(classified_products['A']),
@@ -519,9 +630,9 @@ def get_abc_analysis():
                     'C': len(classified_products['C'])
                 },
                 'category_percentages': {
-                    'A': len(classified_products['A']) / len(sorted_products) * 100,
-                    'B': len(classified_products['B']) / len(sorted_products) * 100,
-                    'C': len(classified_products['C']) / len(sorted_products) * 100
+                    'A': len(classified_products['A']) / len(product_sales) * 100,
+                    'B': len(classified_products['B']) / len(product_sales) * 100,
+                    'C': len(classified_products['C']) / len(product_sales) * 100
                 }
             },
             'period': f'Last {days} days'
@@ -530,40 +641,48 @@ def get_abc_analysis():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @inventory_bp.route('/inventory/turnover', methods=['GET'])
+@cached_analytics
 def get_inventory_turnover():
     """Get inventory turnover analysis"""
     try:
         days = request.args.get('days', 365, type=int)  # Default to 1 year
         start_date = datetime.utcnow() - timedelta(days=days)
         
-        # Get products with their sales data
+        # Get products with their sales data; COGS and the turnover ratio are
+        # computed in SQL (average inventory simplified to current stock), and
+        # a ratio with no stock or no cost value comes back as 0
+        total_sold = func.sum(SaleItem.quantity)
+        cogs = total_sold * Product.cost_price
+        turnover_ratio = func.coalesce(
+            cogs / case((Product.stock_quantity > 0, Product.stock_quantity * Product.cost_price)), 0
+        )
         products_with_sales = db.session.query(
             Product.id,
             Product.name,
             Product.sku,
             Product.stock_quantity,
-            Product.cost_price,
-            func.sum(SaleItem.quantity).label('total_sold'),
-            func.sum(SaleItem.total_price).label('total_revenue')
+            total_sold.label('total_sold'),
+            func.sum(SaleItem.total_price).label('total_revenue'),
+            cogs.label('cogs'),
+            turnover_ratio.label('turnover_ratio')
         ).join(SaleItem).join(Sale).filter(
             Sale.created_at >= start_date,
             Product.is_active == True
-        ).group_by(Product.id).all()
+        ).group_by(Product.id).order_by(turnover_ratio.desc(), Product.id).all()  # Sort by turnover ratio (descending)
         
         turnover_data = []
+        mover_counts = {'Fast': 0, 'Medium': 0, 'Slow': 0}
+        total_turnover = 0
         
         for product in products_with_sales:
-            # Calculate average inventory (simplified - using current stock)
-            avg_inventory = product.stock_quantity
-            
-            # Calculate Cost of Goods Sold (COGS)
-            cogs = product.total_sold * product.cost_price
-            
-            # Calculate turnover ratio
-            turnover_ratio = cogs / (avg_inventory * product.cost_price) if avg_inventory > 0 else 0
-            
-            # Calculate days in inventory
-            days_in_inventory = days / turnover_ratio if turnover_ratio > 0 else float('inf')
+            turnover_ratio = product.turnover_ratio
+            turnover_category = (
+                'Fast' if turnover_ratio > 12 else
+                'Medium' if turnover_ratio > 4 else
+                'Slow'
+            )
+            mover_counts[turnover_category] += 1
+            total_turnover += turnover_ratio
             
             turnover_data.append({
                 'product_id': product.id,
@@ -572,26 +691,20 @@ def get_inventory_turnover():
                 'current_stock': product.stock_quantity,
                 'total_sold': product.total_sold,
                 'total_revenue': product.total_revenue,
-                'cogs': cogs,
+                'cogs': product.cogs,
                 'turnover_ratio': turnover_ratio,
-                'days_in_inventory': days_in_inventory if days_in_inventory != float('inf') else None,
-                'turnover_category': (
-                    'Fast' if turnover_ratio > 12 else
-                    'Medium' if turnover_ratio > 4 else
-                    'Slow'
-                )
+                # Days in inventory
+                'days_in_inventory': days / turnover_ratio if turnover_ratio > 0 else None,
+                'turnover_category': turnover_category
             })
         
-        # Sort by turnover ratio (descending)
-        turnover_data.sort(key=lambda x: x['turnover_ratio'], reverse=True)
-        
         # Calculate summary statistics
         total_products = len(turnover_data)
-        fast_movers = len([p for p in turnover_data if p['turnover_category'] == 'Fast'])
-        medium_movers = len([p for p in turnover_data if p['turnover_category'] == 'Medium'])
-        slow_movers = len([p for p in turnover_data if p['turnover_category'] == 'Slow'])
+        fast_movers = mover_counts['Fast']
+        medium_movers = mover_counts['Medium']
+        slow_movers = mover_counts['Slow']
         
-        avg_turnover = sum(p['turnover_ratio'] for p in turnover_data) / total_products if total_products > 0 else 0
+        avg_turnover = total_turnover / total_products if total_products > 0 else 0
         
         return jsonify({
             'success': True,
@@ -615,51 +728,76 @@ def get_inventory_turnover():
 def get_stock_alerts():
     """Get comprehensive stock alerts"""
     try:
-        # Get all active products
-        products = Product.query.filter_by(is_active=True).all()
-        
-        alerts = {
-            'critical': [],  # Out of stock
-            'warning': [],   # Low stock
-            'overstocked': [] # Overstocked items
-        }
-        
-        for product in products:
-            if product.stock_quantity == 0:
-                alerts['critical'].append({
-                    'product': product.to_dict(),
-                    'alert_type': 'out_of_stock',
-                    'message': f'{product.name} is out of stock'
-                })
-            elif product.stock_quantity <= product.min_stock_level:
-                alerts['warning'].append({
-                    'product': product.to_dict(),
-                    'alert_type': 'low_stock',
-                    'message': f'{product.name} is running low (Current: {product.stock_quantity}, Min: {product.min_stock_level})'
-                })
-            elif product.stock_quantity > (product.min_stock_level * 10):  # Arbitrary overstocked threshold
-                alerts['overstocked'].append({
-                    'product': product.to_dict(),
-                    'alert_type': 'overstocked',
-                    'message': f'{product.name} may be overstocked (Current: {product.stock_quantity})'
-                })
-        
-        total_alerts = len(alerts['critical']) + len(alerts['warning']) + len(alerts['overstocked'])
+        # Bucket products in SQL so only products that raise an alert are loaded
+        alert_bucket = case(
+            (Product.stock_quantity == 0, 'critical'),  # Out of stock
+            (Product.stock_quantity <= Product.min_stock_level, 'warning'),  # Low stock
+            (Product.stock_quantity > Product.min_stock_level * 10, 'overstocked'),  # Arbitrary overstocked threshold
+        )
+        bucket_order = case(
+            (Product.stock_quantity == 0, 0),
+            (Product.stock_quantity <= Product.min_stock_level, 1),
+            else_=2
+        )
+        # Rows arrive bucket by bucket and are fetched from the cursor in chunks
+        alert_rows = db.session.execute(
+            select(Product, alert_bucket).options(
+                joinedload(Product.category).load_only(Category.id, Category.name),
+                selectinload(Product.batches)
+            ).where(
+                Product.is_active == True,
+                alert_bucket.isnot(None)
+            ).order_by(bucket_order, Product.id)
+            .execution_options(yield_per=ALERT_CHUNK_SIZE)
+        )
         
-        return jsonify({
-            'success': True,
-            'data': alerts,
-            'summary': {
-                'total_alerts': total_alerts,
-                'critical_count': len(alerts['critical']),
-                'warning_count': len(alerts['warning']),
-                'overstocked_count': len(alerts['overstocked'])
-            }
-        })
+        def generate():
+            """Stream the alerts one bucket array after another"""
+            counts = dict.fromkeys(ALERT_BUCKETS, 0)
+            opened = 0  # bucket arrays opened so far
+            yield b'{"success":true,"data":{'
+            for rows in alert_rows.partitions():
+                stock_map = compute_batch_stock_map([p.id for p, _ in rows if p.batch_management_enabled])
+                parts = []
+                for product, bucket in rows:
+                    # Open this bucket's array, and any empty ones before it
+                    while opened <= ALERT_BUCKETS.index(bucket):
+                        parts.append((b'],' if opened else b'') + orjson.dumps(ALERT_BUCKETS[opened]) + b':[')
+                        opened += 1
+                    
+                    if bucket == 'critical':
+                        alert_type = 'out_of_stock'
+                        message = f'{product.name} is out of stock'
+                    elif bucket == 'warning':
+                        alert_type = 'low_stock'
+                        message = f'{product.name} is running low (Current: {product.stock_quantity}, Min: {product.min_stock_level})'
+                    else:
+                        alert_type = 'overstocked'
+                        message = f'{product.name} may be overstocked (Current: {product.stock_quantity})'
+                    parts.append((b',' if counts[bucket] else b'') + orjson.dumps({
+                        'product': product.to_dict(stock_map=stock_map),
+                        'alert_type': alert_type,
+                        'message': message
+                    }))
+                    counts[bucket] += 1
+                yield b''.join(parts)
+            
+            while opened < len(ALERT_BUCKETS):
+                yield (b'],' if opened else b'') + orjson.dumps(ALERT_BUCKETS[opened]) + b':['
+                opened += 1
+            yield b']},"summary":' + orjson.dumps({
+                'total_alerts': sum(counts.values()),
+                'critical_count': counts['critical'],
+                'warning_count': counts['warning'],
+                'overstocked_count': counts['overstocked']
+            }) + b'}'
+        
+        return Response(stream_with_context(generate()), mimetype='application/json')
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @inventory_bp.route('/inventory/forecast', methods=['GET'])
+@cached_analytics
 def get_inventory_forecast():
     """Get inventory forecast based on historical sales"""
     try:
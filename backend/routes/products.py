@@ -1,8 +1,9 @@
 from flask import Blueprint, request, jsonify
-from database import db
-from models import Product, Category, SaleItem, Sale, ProductBatch, Purchase, PurchaseItem, Return, ReturnItem
+from database import db, bulk_insert
+from models import Product, Category, SaleItem, Sale, ProductBatch, Purchase, PurchaseItem, Return, ReturnItem, compute_batch_stock_map
 from datetime import datetime, timedelta
 from sqlalchemy import func, and_, or_, desc, asc
+from sqlalchemy.orm import joinedload, selectinload
 
 products_bp = Blueprint('products', __name__)
 
@@ -21,7 +22,7 @@ def get_products():
         min_price = request.args.get('min_price', type=float)
         max_price = request.args.get('max_price', type=float)
         
-        query = Product.query.filter(Product.is_active == True)
+        query = Product.query.options(joinedload(Product.category).load_only(Category.id, Category.name), selectinload(Product.batches)).filter(Product.is_active == True)
         
         # Search filter
         if search:
@@ -74,10 +75,11 @@ def get_products():
         products = query.paginate(
             page=page, per_page=per_page, error_out=False
         )
+        stock_map = compute_batch_stock_map([p.id for p in products.items if p.batch_management_enabled])
         
         return jsonify({
             'success': True,
-            'data': [product.to_dict() for product in products.items],
+            'data': [product.to_dict(stock_map=stock_map) for product in products.items],
             'pagination': {
                 'page': page,
                 'pages': products.pages,
@@ -95,13 +97,19 @@ def get_product_ledger(product_id):
         product = Product.query.get_or_404(product_id)
 
         # Get sales for the product
-        sales = db.session.query(Sale).join(SaleItem).filter(SaleItem.product_id == product_id).order_by(Sale.created_at.desc()).all()
+        sales = db.session.query(Sale).options(
+            selectinload(Sale.items).joinedload(SaleItem.product)
+        ).join(SaleItem).filter(SaleItem.product_id == product_id).order_by(Sale.created_at.desc()).all()
 
         # Get purchases for the product
-        purchases = db.session.query(Purchase).join(PurchaseItem).filter(PurchaseItem.product_id == product_id).order_by(Purchase.created_at.desc()).all()
+        purchases = db.session.query(Purchase).options(
+            selectinload(Purchase.items).joinedload(PurchaseItem.product)
+        ).join(PurchaseItem).filter(PurchaseItem.product_id == product_id).order_by(Purchase.created_at.desc()).all()
 
         # Get returns for the product
-        returns = db.session.query(Return).join(ReturnItem).filter(ReturnItem.product_id == product_id).order_by(Return.created_at.desc()).all()
+        returns = db.session.query(Return).options(
+            selectinload(Return.items).joinedload(ReturnItem.product)
+        ).join(ReturnItem).filter(ReturnItem.product_id == product_id).order_by(Return.created_at.desc()).all()
 
         return jsonify({
             'success': True,
@@ -654,9 +662,19 @@ def bulk_import_products():
             }), 400
         
         created_products = []
+        product_rows = []
         errors = []
         
+        # Look up existing SKUs and valid categories once instead of per row
+        existing_skus = {sku for (sku,) in db.session.query(Product.sku).filter(
+            Product.sku.in_([str(p.get('sku', '')).strip().upper() for p in products_data if isinstance(p, dict)])
+        )}
+        category_ids = {cid for (cid,) in db.session.query(Category.id)}
+        
         for i, product_data in enumerate(products_data):
+            if not isinstance(product_data, dict):
+                errors.append(f'Row {i+1}: product must be an object')
+                continue
             try:
                 # Validate required fields
                 required_fields = ['name', 'price', 'sku', 'category_id']
@@ -665,32 +683,30 @@ def bulk_import_products():
                         errors.append(f'Row {i+1}: {field} is required')
                         continue
                 
-                # Check for duplicate SKU
-                existing_product = Product.query.filter_by(sku=product_data['sku']).first()
-                if existing_product:
+                # Check for duplicate SKU, including earlier rows of this import
+                sku = product_data['sku'].strip().upper()
+                if sku in existing_skus:
                     errors.append(f'Row {i+1}: SKU {product_data["sku"]} already exists')
                     continue
                 
                 # Validate category
-                category = Category.query.get(product_data['category_id'])
-                if not category:
+                if int(product_data['category_id']) not in category_ids:
                     errors.append(f'Row {i+1}: Category {product_data["category_id"]} not found')
                     continue
                 
-                product = Product(
-                    name=product_data['name'].strip(),
-                    description=product_data.get('description', '').strip(),
-                    price=float(product_data['price']),
-                    cost_price=float(product_data.get('cost_price', 0)),
-                    stock_quantity=int(product_data.get('stock_quantity', 0)),
-                    min_stock_level=int(product_data.get('min_stock_level', 5)),
-                    sku=product_data['sku'].strip().upper(),
-                    barcode=product_data.get('barcode', '').strip(),
-                    category_id=int(product_data['category_id']),
-                    is_active=product_data.get('is_active', True)
-                )
-                
-                db.session.add(product)
+                product_rows.append({
+                    'name': product_data['name'].strip(),
+                    'description': product_data.get('description', '').strip(),
+                    'price': float(product_data['price']),
+                    'cost_price': float(product_data.get('cost_price', 0)),
+                    'stock_quantity': int(product_data.get('stock_quantity', 0)),
+                    'min_stock_level': int(product_data.get('min_stock_level', 5)),
+                    'sku': sku,
+                    'barcode': product_data.get('barcode', '').strip(),
+                    'category_id': int(product_data['category_id']),
+                    'is_active': product_data.get('is_active', True)
+                })
+                existing_skus.add(sku)
                 created_products.append(product_data['name'])
                 
             except Exception as e:
@@ -703,6 +719,7 @@ def bulk_import_products():
                 'errors': errors
             }), 400
         
+        bulk_insert(Product, product_rows)
         db.session.commit()
         
         return jsonify({
@@ -851,7 +868,7 @@ def check_duplicate_products():
     """Find potential duplicate products based on name similarity"""
     try:
         # Find products with similar names (basic implementation)
-        products = Product.query.filter_by(is_active=True).all()
+        products = Product.query.options(selectinload(Product.batches)).filter_by(is_active=True).all()
         
         potential_duplicates = []
         processed_names = set()
@@ -892,15 +909,16 @@ def export_products():
         include_inactive = data.get('include_inactive', False)
         include_analytics = data.get('include_analytics', False)
         
-        query = Product.query
+        query = Product.query.options(joinedload(Product.category).load_only(Category.id, Category.name), selectinload(Product.batches))
         if not include_inactive:
             query = query.filter(Product.is_active == True)
         
         products = query.all()
+        stock_map = compute_batch_stock_map([p.id for p in products if p.batch_management_enabled])
         
         export_data = []
         for product in products:
-            product_data = product.to_dict()
+            product_data = product.to_dict(stock_map=stock_map)
             
             if include_analytics:
                 # Add analytics data
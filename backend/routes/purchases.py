@@ -3,6 +3,7 @@ from flask import Blueprint, request, jsonify
 from database import db
 from models import Purchase, PurchaseItem, Product
 from sqlalchemy import func, desc
+from sqlalchemy.orm import selectinload, joinedload
 import uuid
 from datetime import datetime
 
@@ -12,7 +13,9 @@ purchases_bp = Blueprint('purchases', __name__)
 def get_purchases():
     """Get all purchase orders"""
     try:
-        purchases = Purchase.query.order_by(desc(Purchase.created_at)).all()
+        purchases = Purchase.query.options(
+            selectinload(Purchase.items).joinedload(PurchaseItem.product)
+        ).order_by(desc(Purchase.created_at)).all()
         return jsonify({
             'success': True,
             'data': [p.to_dict() for p in purchases]
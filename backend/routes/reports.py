@@ -1,10 +1,12 @@
 from flask import Blueprint, request, jsonify
 from database import db
-from models import Product, Sale, SaleItem, Purchase, PurchaseItem, Customer, Category
+from models import Product, Sale, SaleItem, Purchase, PurchaseItem, Customer, Category, compute_batch_stock_map
 from datetime import datetime, timedelta
 from sqlalchemy import func, and_, or_, desc, asc
+from sqlalchemy.orm import joinedload, selectinload
 from collections import defaultdict
 import calendar
+import heapq
 
 reports_bp = Blueprint('reports', __name__)
 
@@ -125,7 +127,7 @@ def get_sales_report():
         end_dt = datetime.fromisoformat(end_date)
         
         # Base query
-        query = Sale.query.filter(
+        query = Sale.query.options(selectinload(Sale.items).joinedload(SaleItem.product)).filter(
             Sale.created_at >= start_dt,
             Sale.created_at <= end_dt
         )
@@ -428,7 +430,7 @@ def get_inventory_report():
         include_inactive = request.args.get('include_inactive', False, type=bool)
         category_id = request.args.get('category_id', type=int)
         
-        query = Product.query
+        query = Product.query.options(joinedload(Product.category).load_only(Category.id, Category.name))
         if not include_inactive:
             query = query.filter(Product.is_active == True)
         if category_id:
@@ -461,6 +463,9 @@ def get_inventory_report():
             category_breakdown[category_name]['total_retail_value'] += product.stock_quantity * product.price
             category_breakdown[category_name]['total_units'] += product.stock_quantity
         
+        listed_products = out_of_stock[:10] + low_stock[:10]
+        stock_map = compute_batch_stock_map([p.id for p in listed_products if p.batch_management_enabled])
+        
         return jsonify({
             'success': True,
             'data': {
@@ -475,23 +480,19 @@ def get_inventory_report():
                     'out_of_stock_count': len(out_of_stock),
                     'low_stock_count': len(low_stock),
                     'normal_stock_count': len(normal_stock),
-                    'out_of_stock_products': [p.to_dict() for p in out_of_stock[:10]],  # Limit to 10
-                    'low_stock_products': [p.to_dict() for p in low_stock[:10]]  # Limit to 10
+                    'out_of_stock_products': [p.to_dict(stock_map=stock_map) for p in out_of_stock[:10]],  # Limit to 10
+                    'low_stock_products': [p.to_dict(stock_map=stock_map) for p in low_stock[:10]]  # Limit to 10
                 },
                 'category_breakdown': dict(category_breakdown),
-                'top_value_products': sorted(
-                    [
-                        {
-                            'name': p.name,
-                            'sku': p.sku,
-                            'stock_value': p.stock_quantity * p.cost_price,
-                            'stock_quantity': p.stock_quantity
-                        }
-                        for p in products
-                    ],
-                    key=lambda x: x['stock_value'],
-                    reverse=True
-                )[:10]
+                'top_value_products': [
+                    {
+                        'name': p.name,
+                        'sku': p.sku,
+                        'stock_value': p.stock_quantity * p.cost_price,
+                        'stock_quantity': p.stock_quantity
+                    }
+                    for p in heapq.nlargest(10, products, key=lambda p: p.stock_quantity * p.cost_price)
+                ]
             }
         })
     except Exception as e:
@@ -513,7 +514,7 @@ def get_financial_report():
         end_dt = datetime.fromisoformat(end_date)
         
         # Sales data
-        sales = Sale.query.filter(
+        sales = Sale.query.options(selectinload(Sale.items).joinedload(SaleItem.product)).filter(
             Sale.created_at >= start_dt,
             Sale.created_at <= end_dt
         ).all()
@@ -683,7 +684,7 @@ def get_profit_loss_report():
         end_dt = datetime.fromisoformat(end_date)
         
         # Revenue
-        sales = Sale.query.filter(
+        sales = Sale.query.options(selectinload(Sale.items).joinedload(SaleItem.product)).filter(
             Sale.created_at >= start_dt,
             Sale.created_at <= end_dt
         ).all()
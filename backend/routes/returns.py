@@ -1,8 +1,9 @@
 from flask import Blueprint, request, jsonify
 from database import db
-from models import Return, ReturnItem, Sale, Product, CreditNote
+from models import Return, ReturnItem, Sale, Product, CreditNote, Customer
 from datetime import datetime
 import uuid
+from sqlalchemy.orm import selectinload, joinedload
 
 returns_bp = Blueprint('returns', __name__)
 
@@ -14,7 +15,12 @@ def get_returns():
         per_page = request.args.get('per_page', 10, type=int)
         
         # Assuming 'Return' is the correct model name
-        returns_query = Return.query.order_by(Return.created_at.desc())
+        returns_query = Return.query.options(
+            # Return.to_dict only reads the sale number and customer name
+            joinedload(Return.sale).load_only(Sale.id, Sale.sale_number, Sale.customer_id)
+                .joinedload(Sale.customer).load_only(Customer.id, Customer.name),
+            selectinload(Return.items).joinedload(ReturnItem.product)
+        ).order_by(Return.created_at.desc())
         
         paginated_returns = returns_query.paginate(page=page, per_page=per_page, error_out=False)
         
@@ -3,8 +3,10 @@ from database import db
 from models import Sale, SaleItem, Product, Customer, Category, ProductBatch
 from datetime import datetime, timedelta
 from sqlalchemy import func, and_, or_, desc, asc
+from sqlalchemy.orm import selectinload, joinedload
 from collections import defaultdict
 import uuid
+from utils.cache import cache
 
 sales_bp = Blueprint('sales', __name__)
 
@@ -72,7 +74,10 @@ def get_sales():
         else:
             query = query.order_by(desc(order_column))
         
-        sales = query.distinct().paginate(
+        sales = query.options(
+            joinedload(Sale.customer),
+            selectinload(Sale.items).joinedload(SaleItem.product)
+        ).distinct().paginate(
             page=page, per_page=per_page, error_out=False
         )
         
@@ -240,6 +245,7 @@ def create_sale():
             product.updated_at = datetime.utcnow()
         
         db.session.commit()
+        cache.delete_prefix('dashboard:')
         
         return jsonify({
             'success': True,
@@ -657,7 +663,9 @@ def search_sales():
             }), 400
         
         # Search by sale number or customer name
-        sales = db.session.query(Sale).join(Customer, Sale.customer_id == Customer.id, isouter=True).filter(
+        sales = db.session.query(Sale).options(
+            selectinload(Sale.items).joinedload(SaleItem.product)
+        ).join(Customer, Sale.customer_id == Customer.id, isouter=True).filter(
             or_(
                 Sale.sale_number.contains(query),
                 Customer.name.contains(query)
@@ -827,7 +835,7 @@ def export_sales():
         end_date = data.get('end_date')
         include_items = data.get('include_items', False)
         
-        query = Sale.query
+        query = Sale.query.options(selectinload(Sale.items).joinedload(SaleItem.product))
         
         if start_date:
             query = query.filter(Sale.created_at >= datetime.fromisoformat(start_date))
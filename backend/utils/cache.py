@@ -0,0 +1,54 @@
+"""
+In-process response cache for the POS system
+"""
+
+import time
+from collections import OrderedDict
+from threading import Lock
+
+SWEEP_INTERVAL = 60
+MAX_ENTRIES = 1024
+
+class TTLCache:
+    """Thread-safe LRU key/value store whose entries expire after a TTL"""
+
+    def __init__(self, max_entries=MAX_ENTRIES, sweep_interval=SWEEP_INTERVAL):
+        self._data = OrderedDict()
+        self._lock = Lock()
+        self._max_entries = max_entries
+        self._sweep_interval = sweep_interval
+        self._next_sweep = time.monotonic() + sweep_interval
+
+    def get(self, key):
+        """Return the cached value, or None if missing or expired"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        """Store a value for ttl seconds, evicting expired and least recently used entries"""
+        with self._lock:
+            now = time.monotonic()
+            if now >= self._next_sweep:
+                for expired in [k for k, (expires_at, _) in self._data.items() if expires_at < now]:
+                    del self._data[expired]
+                self._next_sweep = now + self._sweep_interval
+            self._data[key] = (now + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self._max_entries:
+                self._data.popitem(last=False)
+
+    def delete_prefix(self, prefix):
+        """Drop every entry whose key starts with prefix"""
+        with self._lock:
+            for key in [k for k in self._data if k.startswith(prefix)]:
+                del self._data[key]
+
+cache = TTLCache()
@@ -2,11 +2,16 @@
 Utility helper functions for the POS system
 """
 
+import base64
+import binascii
 import re
 import uuid
+import zlib
 from datetime import datetime, timedelta
 from functools import wraps
-from flask import jsonify, request
+from flask import current_app, jsonify, request
+import orjson
+from sqlalchemy import DateTime, and_, or_, tuple_
 
 def generate_sku():
     """Generate a unique SKU"""
@@ -50,6 +55,71 @@ def paginate_query(query, page, per_page=20):
         error_out=False
     )
 
+class InvalidCursor(ValueError):
+    """Raised by keyset_paginate for a cursor that cannot be decoded"""
+
+def encode_cursor(sort_value, row_id):
+    """Pack a row's sort value and id into an opaque, URL-safe cursor"""
+    # orjson writes datetimes as ISO 8601, which decode_cursor reads back
+    return base64.urlsafe_b64encode(orjson.dumps([sort_value, row_id])).decode()
+
+def decode_cursor(cursor, sort_column):
+    """Return (sort_value, row_id) from a cursor made by encode_cursor"""
+    try:
+        sort_value, row_id = orjson.loads(base64.urlsafe_b64decode(str(cursor).encode()))
+        if isinstance(row_id, bool) or not isinstance(row_id, int):
+            raise ValueError('cursor id must be an integer')
+        if sort_value is not None and isinstance(sort_column.type, DateTime):
+            sort_value = datetime.fromisoformat(sort_value)
+    except (TypeError, ValueError, binascii.Error, orjson.JSONDecodeError):
+        raise InvalidCursor('Invalid cursor')
+    return sort_value, row_id
+
+def keyset_paginate(query, sort_column, id_column, cursor, per_page, descending=False):
+    """Return (items, next_cursor) for the rows after the position in cursor.
+    
+    Rows are ordered by (sort_column, id), so unlike OFFSET paging only the
+    requested page is read however deep it is. The cursor carries the last
+    row's sort value and id, so paging continues even if that row has since
+    been deleted or filtered out. An empty cursor starts at the first page;
+    next_cursor is None on the last page.
+    """
+    # Each segment is a set of criteria that one index seek can serve. SQLite
+    # sorts NULL first ascending and last descending, and a row value
+    # comparison with NULL matches nothing, so rows with a NULL sort value
+    # are read as a segment of their own rather than OR-ed in, which would
+    # turn the seek into a scan.
+    segments = [()]
+    if cursor:
+        last_value, last_id = decode_cursor(cursor, sort_column)
+        position = tuple_(sort_column, id_column)
+        nullable = getattr(sort_column.expression, 'nullable', False)
+        if descending:
+            if last_value is None:
+                segments = [(sort_column.is_(None), id_column < last_id)]
+            else:
+                segments = [(position < (last_value, last_id),)]
+                if nullable:
+                    segments.append((sort_column.is_(None),))
+        elif last_value is None:
+            segments = [(sort_column.is_(None), id_column > last_id), (sort_column.isnot(None),)]
+        else:
+            segments = [(position > (last_value, last_id),)]
+    
+    order = (sort_column.desc(), id_column.desc()) if descending else (sort_column.asc(), id_column.asc())
+    items = []
+    for criteria in segments:
+        items += query.filter(*criteria).order_by(*order).limit(per_page + 1 - len(items)).all()
+        if len(items) > per_page:
+            break
+    has_more = len(items) > per_page
+    items = items[:per_page]
+    next_cursor = None
+    if has_more:
+        last = items[-1]
+        next_cursor = encode_cursor(getattr(last, sort_column.key), getattr(last, id_column.key))
+    return items, next_cursor
+
 def get_date_range(days=30):
     """Get date range for reports"""
     end_date = datetime.utcnow()
@@ -83,6 +153,27 @@ def parse_datetime(dt_string):
     except (ValueError, TypeError):
         return None
 
+def ojsonify(payload, status=200):
+    """jsonify() replacement that encodes with orjson"""
+    return current_app.response_class(
+        orjson.dumps(payload, option=orjson.OPT_NAIVE_UTC),
+        status=status,
+        mimetype='application/json'
+    )
+
+def gzip_stream(chunks):
+    """Gzip-encode an iterable of byte chunks as they are produced"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31 = gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+def accepts_gzip():
+    """Whether the current client accepts a gzip-encoded response"""
+    return request.accept_encodings['gzip'] > 0
+
 class APIResponse:
     """Standardized API response helper"""
     
@@ -0,0 +1,18 @@
+"""
+WSGI entry point for the POS System API
+
+Run in production with:
+    gunicorn wsgi:application
+
+(worker and thread counts live in gunicorn.conf.py)
+"""
+
+from app import app
+from database import db
+
+# With --preload the app is built once in the master process; drop any pooled
+# connections opened during startup so forked workers don't share them.
+with app.app_context():
+    db.engine.dispose()
+
+application = app
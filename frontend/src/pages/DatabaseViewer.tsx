@@ -26,7 +26,7 @@ import { ScrollArea, ScrollBar } from "@/components/ui/scroll-area";
 
 interface TableData {
   columns: string[];
-  rows: Record<string, any>[];
+  rows: any[][]; // positional, in `columns` order
 }
 
 type AllTablesData = Record<string, TableData>;
@@ -107,8 +107,8 @@ const DatabaseViewer = () => {
                   {currentTableData.rows.length > 0 ? (
                     currentTableData.rows.map((row, rowIndex) => (
                       <TableRow key={rowIndex}>
-                        {currentTableData.columns.map((col) => (
-                          <TableCell key={`${rowIndex}-${col}`}>{String(row[col])}</TableCell>
+                        {currentTableData.columns.map((col, colIndex) => (
+                          <TableCell key={`${rowIndex}-${col}`}>{String(row[colIndex])}</TableCell>
                         ))}
                       </TableRow>
                     ))